@@ -7,15 +7,21 @@ from __future__ import annotations
 
 import argparse
 import logging
+import os
 import sys
 import time
 from pathlib import Path
-from typing import List
+from typing import List, Tuple
 
-import toml
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
 
-from .sc_oauth import ensure_access_token
-from .sc_uploader import upload_track, upload_many, create_playlist
+from .convert import SUPPORTED_EXTS
+from .pipeline import convert_and_upload
+from .sc_oauth import close_session, ensure_access_token
+from .sc_uploader import upload_track, upload_many, create_playlist, _ensure_tracks_streamable
 
 # Configure logging
 logging.basicConfig(
@@ -34,17 +40,26 @@ def load_config() -> dict:
         sys.exit(1)
     
     try:
-        return toml.load(config_path)
+        with open(config_path, 'rb') as f:
+            return tomllib.load(f)
     except Exception as e:
         logger.error(f"Failed to load config.toml: {e}")
         sys.exit(1)
 
 
-def cmd_auth(args) -> int:
+def _list_files(directory: Path, suffixes: Tuple[str, ...] = (".flac",)) -> List[Path]:
+    """Return files directly inside `directory` (non-recursive) with the given suffixes."""
+    with os.scandir(directory) as it:
+        return [
+            Path(entry.path) for entry in it
+            if entry.name.lower().endswith(suffixes) and entry.is_file()
+        ]
+
+
+def cmd_auth(args, config: dict) -> int:
     """Test authentication flow."""
     logger.info("Testing SoundCloud authentication...")
     
-    config = load_config()
     sc_config = config.get('soundcloud', {})
     
     if not all(key in sc_config for key in ['client_id', 'client_secret', 'redirect_uri']):
@@ -60,13 +75,12 @@ def cmd_auth(args) -> int:
         return 1
 
 
-def cmd_upload(args) -> int:
+def cmd_upload(args, config: dict) -> int:
     """Upload a single track."""
     if not args.file.exists():
         logger.error(f"File not found: {args.file}")
         return 1
     
-    config = load_config()
     sc_config = config.get('soundcloud', {})
     
     try:
@@ -82,19 +96,20 @@ def cmd_upload(args) -> int:
         return 1
 
 
-def cmd_upload_dir(args) -> int:
+def cmd_upload_dir(args, config: dict) -> int:
     """Upload all FLAC files from a directory."""
-    if not args.dir.exists():
-        logger.error(f"Directory not found: {args.dir}")
-        return 1
     
     # Find all FLAC files
-    flac_files = list(args.dir.glob("*.flac"))
+    try:
+        flac_files = _list_files(args.dir)
+    except OSError as e:
+        # Missing path, a file instead of a directory, or no permission
+        logger.error(f"Cannot read directory {args.dir}: {e}")
+        return 1
     if not flac_files:
         logger.error(f"No FLAC files found in {args.dir}")
         return 1
     
-    config = load_config()
     sc_config = config.get('soundcloud', {})
     
     try:
@@ -119,9 +134,8 @@ def cmd_upload_dir(args) -> int:
         return 1
 
 
-def cmd_playlist(args) -> int:
+def cmd_playlist(args, config: dict) -> int:
     """Create a playlist with given track IDs."""
-    config = load_config()
     sc_config = config.get('soundcloud', {})
     
     try:
@@ -139,19 +153,20 @@ def cmd_playlist(args) -> int:
 
 
 
-def cmd_poc(args) -> int:
-    """Proof-of-concept: upload directory and create playlist."""
-    if not args.dir.exists():
-        logger.error(f"Directory not found: {args.dir}")
-        return 1
+def cmd_poc(args, config: dict) -> int:
+    """Proof-of-concept: convert/upload directory and create playlist."""
     
-    # Find all FLAC files
-    flac_files = list(args.dir.glob("*.flac"))
-    if not flac_files:
-        logger.error(f"No FLAC files found in {args.dir}")
+    # Find FLAC files, plus WAV/AIFF files to convert on the way
+    try:
+        audio_files = _list_files(args.dir, (".flac", *sorted(SUPPORTED_EXTS)))
+    except OSError as e:
+        # Missing path, a file instead of a directory, or no permission
+        logger.error(f"Cannot read directory {args.dir}: {e}")
+        return 1
+    if not audio_files:
+        logger.error(f"No FLAC/WAV/AIFF files found in {args.dir}")
         return 1
     
-    config = load_config()
     sc_config = config.get('soundcloud', {})
     
     start_time = time.time()
@@ -161,18 +176,19 @@ def cmd_poc(args) -> int:
         logger.info("Step 1: Authenticating...")
         access_token = ensure_access_token(sc_config)
         
-        # Step 2: Upload all tracks
-        logger.info(f"Step 2: Uploading {len(flac_files)} tracks...")
+        # Step 2: Convert (if needed) and upload all tracks, overlapping both
+        logger.info(f"Step 2: Converting/uploading {len(audio_files)} tracks...")
         sharing = args.sharing or sc_config.get('sharing', 'private')
-        result = upload_many(flac_files, access_token, sharing, args.title_prefix)
+        result = convert_and_upload(audio_files, args.out, access_token, sharing, args.title_prefix)
         
         if not result['uploaded']:
             logger.error("No tracks uploaded successfully")
             return 1
         
-        # Step 3: Create playlist
+        # Step 3: Create playlist once the new tracks can be attached to it
         logger.info("Step 3: Creating playlist...")
         track_ids = [track_id for _, track_id in result['uploaded']]
+        _ensure_tracks_streamable(track_ids, access_token)
         playlist_id = create_playlist(args.title, track_ids, access_token, sharing)
         
         # Summary
@@ -212,7 +228,8 @@ def main() -> int:
     
     # POC command
     poc_parser = subparsers.add_parser('poc', help='Proof-of-concept: upload dir and create playlist')
-    poc_parser.add_argument('--dir', type=Path, required=True, help='Directory containing FLAC files')
+    poc_parser.add_argument('--dir', type=Path, required=True, help='Directory containing FLAC/WAV/AIFF files')
+    poc_parser.add_argument('--out', type=Path, default=Path('out'), help='Output directory for converted FLAC files (default: ./out)')
     poc_parser.add_argument('--title', required=True, help='Playlist title')
     poc_parser.add_argument('--sharing', choices=['private', 'public'], help='Upload visibility')
     poc_parser.add_argument('--title-prefix', help='Prefix for track titles')
@@ -224,6 +241,9 @@ def main() -> int:
         parser.print_help()
         return 1
     
+    # Load config once and pass it to the subcommand
+    config = load_config()
+    
     # Route to appropriate command
     commands = {
         'auth': cmd_auth,
@@ -233,7 +253,10 @@ def main() -> int:
         'poc': cmd_poc
     }
     
-    return commands[args.command](args)
+    try:
+        return commands[args.command](args, config)
+    finally:
+        close_session()
 
 
 if __name__ == '__main__':
@@ -6,73 +6,76 @@ Provides a function `convert_to_flac` and a CLI entry point.
 from __future__ import annotations
 
 import argparse
+import os
+import re
 import shutil
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Iterable, List, Tuple
+from typing import Dict, Iterable, List, Set, Tuple
 
 SUPPORTED_EXTS = {".wav", ".aif", ".aiff"}
 
+# Matched against raw ffmpeg stderr bytes, so no decode is needed
+_DURATION_RE = re.compile(rb"Duration: (?:(\d+):(\d+):(\d+\.\d+)|N/A)")
+
+# Resolved once at import; avoids a PATH walk per file in batch mode
+FFMPEG = shutil.which("ffmpeg")
+
+_UNITS = ("B", "KiB", "MiB", "GiB", "TiB")
+
+# Max files handed to a single ffmpeg process in batch mode
+BATCH_SIZE = 16
+
 
 def bytes_to_human(n: int) -> str:
     """Convert a byte count to a human-friendly string.
 
     Examples: 1024 -> "1.0 KiB", 1048576 -> "1.0 MiB".
     """
-    units = ["B", "KiB", "MiB", "GiB", "TiB"]
-    size = float(n)
-    for unit in units:
-        if size < 1024.0 or unit == units[-1]:
-            return f"{size:.1f} {unit}"
-        size /= 1024.0
+    # Each unit is 2**10 of the previous, so the unit index is bit_length // 10
+    i = min(len(_UNITS) - 1, (max(n, 1).bit_length() - 1) // 10)
+    return f"{n / (1 << (10 * i)):.1f} {_UNITS[i]}"
 
 
-def _run(cmd: List[str]) -> subprocess.CompletedProcess:
+def _run(cmd: List[str], capture: bool = False) -> subprocess.CompletedProcess:
     """Run a subprocess command and return CompletedProcess.
 
+    Output is discarded unless `capture` is set, in which case stderr is kept
+    (as bytes) on the result and on any CalledProcessError.
     Raises subprocess.CalledProcessError on non-zero exit.
     """
-    return subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr = subprocess.PIPE if capture else subprocess.DEVNULL
+    return subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=stderr)
+
 
+def _format_duration(seconds: float) -> str:
+    """Return a duration as a short string, e.g., "3m12s" or "12.3s"."""
+    if seconds >= 60:
+        minutes = int(seconds // 60)
+        rem = seconds - minutes * 60
+        if rem < 9.95:
+            # Keep one decimal for short remainder
+            return f"{minutes}m{rem:.1f}s"
+        return f"{minutes}m{int(round(rem))}s"
+    return f"{seconds:.1f}s"
 
-def _probe_duration(input_path: Path) -> str:
-    """Return media duration as a short string via ffprobe, e.g., "3m12s" or "12.3s".
 
-    If probing fails, returns "?s".
+def _parse_durations(stderr: bytes | None) -> List[str]:
+    """Return the input durations ffmpeg reported on stderr, in input order.
+
+    ffmpeg prints a "Duration: HH:MM:SS.ss" line per input while probing, so
+    no separate ffprobe run is needed. Inputs with an unknown duration yield "?s".
     """
-    if shutil.which("ffprobe") is None:
-        return "?s"
-    try:
-        # Extract duration in seconds with high precision
-        proc = subprocess.run(
-            [
-                "ffprobe",
-                "-v",
-                "error",
-                "-show_entries",
-                "format=duration",
-                "-of",
-                "default=noprint_wrappers=1:nokey=1",
-                str(input_path),
-            ],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
-        out = proc.stdout.strip()
-        seconds = float(out)
-        if seconds >= 60:
-            minutes = int(seconds // 60)
-            rem = seconds - minutes * 60
-            if rem < 9.95:
-                # Keep one decimal for short remainder
-                return f"{minutes}m{rem:.1f}s"
-            return f"{minutes}m{int(round(rem))}s"
-        return f"{seconds:.1f}s"
-    except Exception:
-        return "?s"
+    durations = []
+    for m in _DURATION_RE.finditer(stderr or b""):
+        if m.group(1) is None:
+            durations.append("?s")
+            continue
+        h, mi, sec = m.groups()
+        durations.append(_format_duration(int(h) * 3600 + int(mi) * 60 + float(sec)))
+    return durations
 
 
 def convert_to_flac(src: Path, dst: Path) -> None:
@@ -81,13 +84,15 @@ def convert_to_flac(src: Path, dst: Path) -> None:
     Preserves sample rate and bit depth (no resampling), using ffmpeg's FLAC encoder.
     Overwrites `dst` if it exists.
     """
-    if shutil.which("ffmpeg") is None:
+    if FFMPEG is None:
         raise RuntimeError("ffmpeg not found in PATH. Please install ffmpeg.")
 
     dst.parent.mkdir(parents=True, exist_ok=True)
 
     cmd = [
-        "ffmpeg",
+        FFMPEG,
+        "-hide_banner",
+        "-nostats",
         "-y",
         "-i",
         str(src),
@@ -104,38 +109,57 @@ def _gather_inputs(root: Path) -> Iterable[Path]:
         if root.suffix.lower() in SUPPORTED_EXTS:
             yield root
         return
-    for p in root.rglob("*"):
-        if p.is_file() and p.suffix.lower() in SUPPORTED_EXTS:
-            yield p
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            # Match the extension on the bare name; only build a Path for hits
+            dot = name.rfind(".")
+            if dot > 0 and name[dot:].lower() in SUPPORTED_EXTS:
+                yield Path(dirpath, name)
 
 
 def _derive_output_path(in_file: Path, out_dir: Path) -> Path:
     return out_dir / (in_file.stem + ".flac")
 
 
+def _existing_outputs(out_dir: Path) -> Set[str]:
+    """Return the names of files already in `out_dir` using a single directory scan."""
+    try:
+        with os.scandir(out_dir) as it:
+            return {entry.name for entry in it}
+    except FileNotFoundError:
+        return set()
+
+
+def _output_size(out_file: Path) -> int:
+    """Return the size of `out_file` in bytes, or 0 if it doesn't exist."""
+    try:
+        return out_file.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
 def _convert_one(in_file: Path, out_file: Path, overwrite: bool) -> Tuple[bool, str]:
     """Convert one file and return (ok, message). Never raises.
 
     Logs concise per-file message including duration and output size on success.
+    The output directory must already exist (see `main`).
     """
-    duration = _probe_duration(in_file)
     try:
-        if shutil.which("ffmpeg") is None:
+        if FFMPEG is None:
             return False, "ffmpeg not found in PATH"
 
-        out_file.parent.mkdir(parents=True, exist_ok=True)
-
-        cmd = ["ffmpeg"]
+        # -hide_banner/-nostats leave little on stderr besides the Duration line
+        cmd = [FFMPEG, "-hide_banner", "-nostats"]
         if overwrite:
             cmd.append("-y")
-        cmd += ["-i", str(in_file), "-c:a", "flac", str(out_file)]
-
-        if not overwrite and out_file.exists():
+        elif out_file.exists():
             return True, f"[SKIP] {in_file.name} exists"
+        cmd += ["-i", str(in_file), "-c:a", "flac", str(out_file)]
 
-        _run(cmd)
+        proc = _run(cmd, capture=True)
+        duration = (_parse_durations(proc.stderr) or ["?s"])[0]
 
-        size = out_file.stat().st_size if out_file.exists() else 0
+        size = _output_size(out_file)
         return True, f"[OK] {in_file.name} {duration} -> {bytes_to_human(size)}"
     except subprocess.CalledProcessError as e:
         err = e.stderr.decode("utf-8", errors="ignore") if isinstance(e.stderr, (bytes, bytearray)) else str(e)
@@ -144,6 +168,54 @@ def _convert_one(in_file: Path, out_file: Path, overwrite: bool) -> Tuple[bool,
         return False, f"[ERR] {in_file.name}: {e}"
 
 
+def _convert_batch(files: List[Tuple[Path, Path]], overwrite: bool) -> List[Tuple[bool, str]]:
+    """Convert several (src, dst) pairs with one ffmpeg process. Never raises.
+
+    Returns one (ok, message) per pair, in input order. Amortizes ffmpeg startup
+    across the batch; if the batch fails, falls back to `_convert_one` per file
+    so the offending input is isolated. Output directories must already exist.
+    Without `overwrite`, callers pass only outputs that did not exist (see the
+    directory scan in `main`); ffmpeg's -n refuses any that appeared since.
+    """
+    if FFMPEG is None:
+        return [_convert_one(src, dst, overwrite) for src, dst in files]
+
+    try:
+        cmd = [FFMPEG, "-hide_banner", "-nostats", "-y" if overwrite else "-n"]
+        for src, _ in files:
+            cmd += ["-i", str(src)]
+        for i, (_, dst) in enumerate(files):
+            # Without explicit mapping every output takes input #0's tags and chapters
+            cmd += [
+                "-map", f"{i}:a:0", "-map_metadata", str(i), "-map_chapters", str(i),
+                "-c:a", "flac", str(dst),
+            ]
+
+        proc = _run(cmd, capture=True)
+    except Exception as e:
+        # ffmpeg may have opened some outputs before failing; remove them rather
+        # than let --no-overwrite report the partial files as skipped. An output
+        # -n refused was not written by this run, so it stays.
+        if not overwrite:
+            stderr = getattr(e, "stderr", None) or b""
+            for _, dst in files:
+                if b"'" + os.fsencode(dst) + b"' already exists" not in stderr:
+                    dst.unlink(missing_ok=True)
+        return [_convert_one(src, dst, overwrite) for src, dst in files]
+
+    durations = _parse_durations(proc.stderr)
+    durations += ["?s"] * (len(files) - len(durations))
+    return [
+        (True, f"[OK] {src.name} {duration} -> {bytes_to_human(_output_size(dst))}")
+        for (src, dst), duration in zip(files, durations)
+    ]
+
+
+def _chunked(items: List[Tuple[Path, Path]], size: int) -> Iterable[List[Tuple[Path, Path]]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
 def main(argv: List[str] | None = None) -> int:
     parser = argparse.ArgumentParser(description="Convert WAV/AIFF to FLAC using ffmpeg")
     parser.add_argument("--in", dest="input_path", required=True, help="Input file or directory")
@@ -152,6 +224,12 @@ def main(argv: List[str] | None = None) -> int:
     ow_group.add_argument("--overwrite", dest="overwrite", action="store_true", help="Overwrite existing files (default)")
     ow_group.add_argument("--no-overwrite", dest="overwrite", action="store_false", help="Do not overwrite existing files")
     parser.set_defaults(overwrite=True)
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of parallel ffmpeg processes (default: CPU count)",
+    )
 
     args = parser.parse_args(argv)
 
@@ -160,7 +238,7 @@ def main(argv: List[str] | None = None) -> int:
 
     print(f"AutoLive convert: input={input_path} out={out_dir} overwrite={args.overwrite}")
 
-    if shutil.which("ffmpeg") is None:
+    if FFMPEG is None:
         print("[ERR] ffmpeg not found in PATH. Install via Homebrew: brew install ffmpeg", file=sys.stderr)
         return 2
 
@@ -168,22 +246,63 @@ def main(argv: List[str] | None = None) -> int:
         print(f"[ERR] Input path does not exist: {input_path}", file=sys.stderr)
         return 2
 
-    files = list(_gather_inputs(input_path))
-    if not files:
-        print("No input audio files found (.wav, .aif, .aiff).")
-        return 0
+    jobs = max(1, args.jobs)
+    print(f"Starting conversion with {jobs} job(s)...")
 
-    print(f"Found {len(files)} file(s). Starting conversion...")
+    # Each ffmpeg run is an independent subprocess, so threads are enough to
+    # keep several encodes in flight without any pickling overhead. Full
+    # batches (one ffmpeg per batch) are submitted while the input tree is
+    # still being walked, but only once there are enough files to give every
+    # idle job one; whatever is left when the walk ends is spread across all
+    # jobs, so small inputs still keep every job busy.
+    # With --no-overwrite, one scan of out_dir answers "exists?" for every
+    # output instead of a stat() per file.
+    existing = set() if args.overwrite else _existing_outputs(out_dir)
 
+    total = 0
     failures = 0
-    for f in files:
-        out_file = _derive_output_path(f, out_dir)
-        ok, msg = _convert_one(f, out_file, overwrite=args.overwrite)
-        print(msg)
-        if not ok:
-            failures += 1
-
-    print(f"Done. {len(files) - failures} succeeded, {failures} failed.")
+    # Output names already scheduled; casefolded so case-insensitive volumes
+    # can't have two inputs writing one file either
+    claimed: Dict[str, Path] = {}
+    with ThreadPoolExecutor(max_workers=jobs) as ex:
+        futures = []
+        batch: List[Tuple[Path, Path]] = []
+        for f in _gather_inputs(input_path):
+            if total == 0:
+                # All outputs share out_dir, so create it once rather than per file
+                out_dir.mkdir(parents=True, exist_ok=True)
+            total += 1
+            out_file = _derive_output_path(f, out_dir)
+            if out_file.name in existing:
+                print(f"[SKIP] {f.name} exists")
+                continue
+            # Repeated stems in different folders (e.g. Day1/ and Day2/ZOOM0001.WAV)
+            # would have concurrent encodes writing the same output
+            first = claimed.setdefault(out_file.name.casefold(), f)
+            if first is not f:
+                print(f"[ERR] {f}: {out_file.name} is also the output of {first}")
+                failures += 1
+                continue
+            batch.append((f, out_file))
+            if len(batch) % BATCH_SIZE == 0:
+                idle = jobs - sum(not fut.done() for fut in futures)
+                if len(batch) >= BATCH_SIZE * max(1, idle):
+                    futures += [ex.submit(_convert_batch, chunk, args.overwrite) for chunk in _chunked(batch, BATCH_SIZE)]
+                    batch = []
+        tail_size = max(1, -(-len(batch) // jobs))
+        futures += [ex.submit(_convert_batch, chunk, args.overwrite) for chunk in _chunked(batch, tail_size)]
+
+        for fut in as_completed(futures):
+            for ok, msg in fut.result():
+                print(msg)
+                if not ok:
+                    failures += 1
+
+    if total == 0:
+        print("No input audio files found (.wav, .aif, .aiff).")
+        return 0
+
+    print(f"Done. {total} file(s): {total - failures} succeeded, {failures} failed.")
     return 1 if failures > 0 else 0
 
 
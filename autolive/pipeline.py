@@ -0,0 +1,113 @@
+"""Convert-and-upload pipeline.
+
+Overlaps ffmpeg conversion with SoundCloud uploads: while one file converts,
+previously converted files are already uploading.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from .convert import SUPPORTED_EXTS, _convert_one, _derive_output_path
+from .sc_uploader import UPLOAD_WORKERS, _auth_headers, upload_track
+
+logger = logging.getLogger(__name__)
+
+
+async def _convert_and_upload(
+    files: List[Path],
+    out_dir: Path,
+    access_token: str,
+    sharing: str,
+    title_prefix: str | None,
+    workers: int,
+) -> Dict[str, List]:
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers)
+    uploaded: Dict[int, Tuple[Path, int]] = {}
+    failed: Dict[int, Path] = {}
+    headers = _auth_headers(access_token)
+
+    async def produce() -> None:
+        for idx, path in enumerate(files):
+            if path.suffix.lower() in SUPPORTED_EXTS:
+                flac_path = _derive_output_path(path, out_dir)
+                ok, msg = await asyncio.to_thread(_convert_one, path, flac_path, True)
+                logger.info(msg)
+                if not ok:
+                    failed[idx] = path
+                    continue
+            else:
+                flac_path = path
+            await queue.put((idx, flac_path))
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def consume() -> None:
+        while (item := await queue.get()) is not None:
+            idx, flac_path = item
+            title = flac_path.stem
+            if title_prefix:
+                title = f"{title_prefix} - {title}"
+            try:
+                track_id = await asyncio.to_thread(
+                    upload_track, flac_path, title, access_token, sharing, headers=headers
+                )
+                uploaded[idx] = (flac_path, track_id)
+            except Exception as e:
+                logger.error(f"UPLOAD FAILED file={flac_path.name} error={e}")
+                failed[idx] = flac_path
+
+    await asyncio.gather(produce(), *(consume() for _ in range(workers)))
+
+    # Report in input order so playlists keep the original track order
+    return {
+        'uploaded': [uploaded[i] for i in sorted(uploaded)],
+        'failed': [failed[i] for i in sorted(failed)],
+    }
+
+
+def convert_and_upload(
+    files: List[Path],
+    out_dir: Path,
+    access_token: str,
+    sharing: str = "private",
+    title_prefix: str | None = None,
+    workers: int = UPLOAD_WORKERS,
+) -> Dict[str, List]:
+    """Convert WAV/AIFF inputs to FLAC and upload them, overlapping both stages.
+
+    FLAC inputs are uploaded as-is; other inputs are converted into `out_dir`
+    first. A bounded queue between the stages caps how far conversion may run
+    ahead of the uploads.
+
+    Args:
+        files: FLAC, WAV or AIFF files to deliver
+        out_dir: Output directory for converted FLAC files
+        access_token: Valid SoundCloud access token
+        sharing: "private" or "public"
+        title_prefix: Optional prefix for track titles
+        workers: Number of concurrent uploads; also bounds how many
+            converted files may wait in the queue
+
+    Returns:
+        Dict with 'uploaded' and 'failed' lists, as returned by `upload_many`
+    """
+    logger.info(f"Starting pipeline for {len(files)} files ({workers} upload workers)")
+    start_time = time.time()
+    if any(path.suffix.lower() in SUPPORTED_EXTS for path in files):
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+    result = asyncio.run(
+        _convert_and_upload(files, out_dir, access_token, sharing, title_prefix, max(1, workers))
+    )
+
+    elapsed = time.time() - start_time
+    logger.info(
+        f"PIPELINE SUMMARY uploaded={len(result['uploaded'])} "
+        f"failed={len(result['failed'])} elapsed={elapsed:.0f}s"
+    )
+    return result
@@ -8,13 +8,18 @@ from __future__ import annotations
 import json
 import logging
 import secrets
+import socket
+import threading
 import time
 import webbrowser
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 from urllib.parse import urlencode, parse_qs, urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 
 logger = logging.getLogger(__name__)
 
@@ -22,9 +27,46 @@ logger = logging.getLogger(__name__)
 AUTH_URL = "https://soundcloud.com/connect"
 TOKEN_URL = "https://api.soundcloud.com/oauth2/token"
 
+# Transport-level retries for idempotent calls (GET/PUT), honoring Retry-After.
+# POSTs are left to the callers: a streamed upload body can't be replayed.
+_RETRY = Retry(
+    total=3,
+    backoff_factor=1,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=frozenset(['GET', 'PUT']),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+# Shared HTTP session for every SoundCloud call, here and in sc_uploader:
+# keep-alive and TLS resumption across token, upload and playlist calls
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=_RETRY))
+_SESSION.headers.update({"User-Agent": "autolive/1.0"})
+
+# Local redirect target for the authorization callback
+CALLBACK_HOST = "127.0.0.1"
+CALLBACK_PORT = 53682
+CALLBACK_READ_TIMEOUT = 10  # seconds to wait for a request on an open connection
+
 # Token storage
 TOKEN_FILE = Path.home() / ".autolive" / "sc_tokens.json"
 
+# Parsed token file keyed by its mtime_ns (see _load_tokens)
+_tokens_cache: Tuple[int, Dict[str, Any]] | None = None
+
+# Refresh this many seconds before expiry so callers never get a stale token
+REFRESH_SKEW_S = 60
+
+# In-flight refreshes keyed by client_id, so concurrent callers share one request
+_refresh_lock = threading.Lock()
+_refresh_inflight: Dict[str, Future] = {}
+
+
+def close_session() -> None:
+    """Close pooled connections held by the shared session."""
+    _SESSION.close()
+
 
 def _ensure_token_dir() -> None:
     """Ensure the token directory exists with proper permissions."""
@@ -32,38 +74,66 @@ def _ensure_token_dir() -> None:
 
 
 def _load_tokens() -> Dict[str, Any] | None:
-    """Load tokens from disk. Returns None if file doesn't exist or is invalid."""
-    if not TOKEN_FILE.exists():
-        return None
+    """Load tokens from disk. Returns None if file doesn't exist or is invalid.
+
+    The parsed file is cached by mtime, so repeat calls skip the read and parse.
+    """
+    global _tokens_cache
     
     try:
-        with open(TOKEN_FILE, 'r') as f:
-            data = json.load(f)
-        
-        # Check if tokens are expired
-        if 'expires_at' in data and time.time() >= data['expires_at']:
-            logger.info("Tokens expired, will need refresh")
-            return data  # Return expired tokens for refresh
-        
-        return data
-    except (json.JSONDecodeError, KeyError, OSError) as e:
-        logger.warning(f"Failed to load tokens: {e}")
+        mtime_ns = TOKEN_FILE.stat().st_mtime_ns
+    except OSError:
         return None
+    
+    if _tokens_cache is not None and _tokens_cache[0] == mtime_ns:
+        data = _tokens_cache[1]
+    else:
+        try:
+            with open(TOKEN_FILE, 'r') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Failed to load tokens: {e}")
+            return None
+        _tokens_cache = (mtime_ns, data)
+    
+    return data  # Expired tokens are returned for refresh
+
+
+def _same_tokens(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """Return True if both token sets match and expire within 5s of each other."""
+    if a.get('access_token') != b.get('access_token') or a.get('refresh_token') != b.get('refresh_token'):
+        return False
+    if 'expires_at' in a and 'expires_at' in b:
+        return abs(a['expires_at'] - b['expires_at']) < 5
+    return 'expires_at' not in a and 'expires_at' not in b
 
 
 def _save_tokens(token_data: Dict[str, Any]) -> None:
-    """Save tokens to disk with proper permissions."""
-    _ensure_token_dir()
+    """Save tokens to disk with proper permissions.
+
+    Skips the write when the file already holds the same tokens (expiry within
+    a few seconds), as happens when a refresh hands back unchanged tokens.
+    """
+    global _tokens_cache
     
     # Add expiration timestamp
     if 'expires_in' in token_data:
         token_data['expires_at'] = time.time() + token_data['expires_in']
     
+    current = _load_tokens()
+    if current is not None and _same_tokens(current, token_data):
+        _tokens_cache = (_tokens_cache[0], token_data)
+        logger.debug("Tokens unchanged, skipping save")
+        return
+    
+    _ensure_token_dir()
+    
     with open(TOKEN_FILE, 'w') as f:
-        json.dump(token_data, f, indent=2)
+        json.dump(token_data, f, separators=(",", ":"))
     
     # Set restrictive permissions
     TOKEN_FILE.chmod(0o600)
+    _tokens_cache = (TOKEN_FILE.stat().st_mtime_ns, token_data)
     logger.info("Tokens saved securely")
 
 
@@ -74,6 +144,97 @@ def _mask_token(token: str) -> str:
     return "*" * (len(token) - 6) + token[-6:]
 
 
+def _http_response(status: str, body: bytes) -> bytes:
+    """Build a minimal HTTP/1.1 response that closes the connection."""
+    return (
+        f"HTTP/1.1 {status}\r\n"
+        f"Content-Type: text/html\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n"
+    ).encode("ascii") + body
+
+
+_CALLBACK_OK = _http_response("200 OK", b'''
+<html><body>
+<h1>Authorization Successful!</h1>
+<p>You can close this window and return to the terminal.</p>
+</body></html>
+''')
+
+_CALLBACK_FAILED = _http_response("400 Bad Request", b'''
+<html><body>
+<h1>Authorization Failed</h1>
+<p>Missing authorization code. Please try again.</p>
+</body></html>
+''')
+
+
+_NOT_FOUND = _http_response("404 Not Found", b"")
+
+
+def _listen_for_callback() -> socket.socket:
+    """Open the listening socket for the OAuth redirect."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((CALLBACK_HOST, CALLBACK_PORT))
+        server.listen(1)
+    except OSError:
+        server.close()
+        raise
+    return server
+
+
+def _accept_callback(server: socket.socket, timeout: float) -> Dict[str, list]:
+    """Serve requests on `server` until the OAuth redirect arrives; return its query parameters.
+
+    Handles one request per connection on the calling thread, like
+    HTTPServer.handle_request(), but without a server thread or shutdown poll.
+    Requests carrying no query (e.g. /favicon.ico) get a 404 and are skipped,
+    as are connections that never send a request or reset (browser preconnects).
+    Only the request line is needed, so headers are read up to the blank line
+    and the rest is ignored. Raises TimeoutError if no redirect arrives in time.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("no callback received")
+        server.settimeout(remaining)
+        conn, _ = server.accept()
+        with conn:
+            conn.settimeout(min(remaining, CALLBACK_READ_TIMEOUT))
+            data = b""
+            try:
+                while b"\r\n\r\n" not in data and len(data) < 65536:
+                    chunk = conn.recv(4096)
+                    if not chunk:
+                        break
+                    data += chunk
+            except OSError:
+                # Timed out or reset before a full request arrived
+                continue
+            
+            # e.g. "GET /callback?code=...&state=... HTTP/1.1"
+            request_line = data.split(b"\r\n", 1)[0].decode("latin-1")
+            parts = request_line.split(" ")
+            target = parts[1] if len(parts) >= 2 else ""
+            query = urlparse(target).query
+            if query:
+                # Any redirect with a query (code, or error=...) ends the wait
+                params = parse_qs(query)
+                ok = 'code' in params and 'state' in params
+                response = _CALLBACK_OK if ok else _CALLBACK_FAILED
+            else:
+                params, response = None, _NOT_FOUND
+            try:
+                conn.sendall(response)
+            except OSError:
+                pass  # the browser went away; the request itself was read
+            if params is not None:
+                return params
+
+
 def authorize_and_exchange(client_id: str, client_secret: str, redirect_uri: str) -> Dict[str, Any]:
     """Perform OAuth 2.1 authorization code flow.
     
@@ -91,7 +252,7 @@ def authorize_and_exchange(client_id: str, client_secret: str, redirect_uri: str
     logger.info("Starting SoundCloud OAuth authorization")
     
     # Generate state parameter for CSRF protection
-    state = secrets.token_urlsafe(32)
+    state = secrets.token_urlsafe(16)  # 128 bits is ample for CSRF
     
     # Build authorization URL
     auth_params = {
@@ -103,74 +264,24 @@ def authorize_and_exchange(client_id: str, client_secret: str, redirect_uri: str
     }
     auth_url = f"{AUTH_URL}?{urlencode(auth_params)}"
     
-    logger.info(f"Opening browser for authorization: {auth_url}")
-    webbrowser.open(auth_url)
-    
-    # Start local server to capture callback
-    from http.server import HTTPServer, BaseHTTPRequestHandler
-    import threading
-    
-    auth_code = None
-    received_state = None
-    
-    class CallbackHandler(BaseHTTPRequestHandler):
-        def do_GET(self):
-            nonlocal auth_code, received_state
-            
-            # Parse query parameters
-            parsed = urlparse(self.path)
-            params = parse_qs(parsed.query)
-            
-            if 'code' in params and 'state' in params:
-                auth_code = params['code'][0]
-                received_state = params['state'][0]
-                
-                # Send success response
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                self.wfile.write(b'''
-                <html><body>
-                <h1>Authorization Successful!</h1>
-                <p>You can close this window and return to the terminal.</p>
-                </body></html>
-                ''')
-            else:
-                # Send error response
-                self.send_response(400)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                self.wfile.write(b'''
-                <html><body>
-                <h1>Authorization Failed</h1>
-                <p>Missing authorization code. Please try again.</p>
-                </body></html>
-                ''')
+    # Listen before opening the browser so the redirect can't beat the socket
+    with _listen_for_callback() as server:
+        logger.info(f"Opening browser for authorization: {auth_url}")
+        webbrowser.open(auth_url)
         
-        def log_message(self, format, *args):
-            # Suppress default logging
-            pass
-    
-    # Start server
-    server = HTTPServer(('127.0.0.1', 53682), CallbackHandler)
-    server_thread = threading.Thread(target=server.serve_forever)
-    server_thread.daemon = True
-    server_thread.start()
-    
-    logger.info("Waiting for authorization callback on http://127.0.0.1:53682/callback")
-    
-    # Wait for callback (with timeout)
-    timeout = 300  # 5 minutes
-    start_time = time.time()
-    
-    while auth_code is None and (time.time() - start_time) < timeout:
-        time.sleep(1)
-    
-    server.shutdown()
-    server.server_close()
+        logger.info(f"Waiting for authorization callback on http://{CALLBACK_HOST}:{CALLBACK_PORT}/callback")
+        
+        # Wait for callback (with timeout)
+        timeout = 300  # 5 minutes
+        try:
+            params = _accept_callback(server, timeout)
+        except TimeoutError:
+            raise RuntimeError("Authorization timeout - no callback received")
     
-    if auth_code is None:
-        raise RuntimeError("Authorization timeout - no callback received")
+    if 'code' not in params or 'state' not in params:
+        raise RuntimeError("Authorization failed - callback missing code or state")
+    auth_code = params['code'][0]
+    received_state = params['state'][0]
     
     # Verify state parameter
     if received_state != state:
@@ -188,7 +299,7 @@ def authorize_and_exchange(client_id: str, client_secret: str, redirect_uri: str
     }
     
     try:
-        response = requests.post(TOKEN_URL, data=token_data, timeout=30)
+        response = _SESSION.post(TOKEN_URL, data=token_data, timeout=30)
         response.raise_for_status()
         
         token_response = response.json()
@@ -226,7 +337,7 @@ def refresh_access_token(client_id: str, client_secret: str, refresh_token: str)
     }
     
     try:
-        response = requests.post(TOKEN_URL, data=token_data, timeout=30)
+        response = _SESSION.post(TOKEN_URL, data=token_data, timeout=30)
         response.raise_for_status()
         
         token_response = response.json()
@@ -240,6 +351,41 @@ def refresh_access_token(client_id: str, client_secret: str, refresh_token: str)
         raise RuntimeError(f"Token refresh failed: {e}")
 
 
+def _needs_refresh(tokens: Dict[str, Any]) -> bool:
+    """Return True if tokens expire within REFRESH_SKEW_S seconds."""
+    return 'expires_at' in tokens and time.time() + REFRESH_SKEW_S >= tokens['expires_at']
+
+
+def _refresh_deduplicated(client_id: str, client_secret: str, refresh_token: str) -> Dict[str, Any]:
+    """Refresh tokens, sharing a single in-flight request among concurrent callers.
+
+    The first caller performs the refresh; others block on its result.
+    """
+    with _refresh_lock:
+        future = _refresh_inflight.get(client_id)
+        owner = future is None
+        if owner:
+            future = Future()
+            _refresh_inflight[client_id] = future
+    
+    if not owner:
+        return future.result()
+    
+    try:
+        # Another caller may have refreshed (and saved) since we loaded
+        tokens = _load_tokens()
+        if tokens is None or _needs_refresh(tokens):
+            tokens = refresh_access_token(client_id, client_secret, refresh_token)
+        future.set_result(tokens)
+        return tokens
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _refresh_lock:
+            _refresh_inflight.pop(client_id, None)
+
+
 def ensure_access_token(config: Dict[str, Any]) -> str:
     """Ensure we have a valid access token, refreshing if necessary.
     
@@ -263,15 +409,25 @@ def ensure_access_token(config: Dict[str, Any]) -> str:
             config['client_secret'], 
             config['redirect_uri']
         )
-    elif 'expires_at' in tokens and time.time() >= tokens['expires_at']:
-        # Tokens expired - refresh
+    elif _needs_refresh(tokens):
+        # Tokens expired or about to - refresh
+        if time.time() >= tokens['expires_at']:
+            logger.info("Tokens expired, will need refresh")
         if 'refresh_token' not in tokens:
-            raise RuntimeError("Tokens expired and no refresh token available")
+            if time.time() >= tokens['expires_at']:
+                raise RuntimeError("Tokens expired and no refresh token available")
+            return tokens['access_token']
         
-        tokens = refresh_access_token(
-            config['client_id'],
-            config['client_secret'],
-            tokens['refresh_token']
-        )
+        try:
+            tokens = _refresh_deduplicated(
+                config['client_id'],
+                config['client_secret'],
+                tokens['refresh_token']
+            )
+        except RuntimeError as e:
+            # An early refresh failing shouldn't sink a token that still works
+            if time.time() >= tokens['expires_at']:
+                raise
+            logger.warning(f"Early token refresh failed, using current token: {e}")
     
     return tokens['access_token']
\ No newline at end of file
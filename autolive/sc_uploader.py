@@ -5,12 +5,32 @@ Handles single and batch track uploads with retry logic and error handling.
 
 from __future__ import annotations
 
+import json
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import List, Tuple, Dict, Any
 
 import requests
+from requests.adapters import HTTPAdapter
+from requests_toolbelt import MultipartEncoder
+
+from .sc_oauth import _SESSION
+
+try:
+    import orjson
+except ImportError:  # optional speedup for JSON bodies
+    orjson = None
+
+try:
+    import httpx
+    import h2  # noqa: F401  (needed for httpx's http2=True)
+except ImportError:  # optional HTTP/2 transport for status polling
+    httpx = None
+
+# ValueError covers malformed JSON bodies: httpx raises a plain json.JSONDecodeError
+_POLL_ERRORS = (requests.RequestException, ValueError) + ((httpx.HTTPError,) if httpx is not None else ())
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +42,21 @@ PLAYLIST_URL = "https://api.soundcloud.com/playlists"
 MAX_FILE_SIZE = 500 * 1024 * 1024  # 500MB
 MAX_RETRIES = 3
 RETRY_DELAYS = [1, 2, 4]  # Exponential backoff delays
+MAX_RETRY_AFTER_S = 60  # Cap on a server-requested Retry-After wait
+UPLOAD_WORKERS = 4  # Concurrent uploads in batch mode
+UPLOAD_READ_BUFFER = 1 << 20  # 1MiB file buffer behind the 8KiB socket reads
+
+
+def _auth_headers(access_token: str) -> Dict[str, str]:
+    """Build the OAuth header for SoundCloud API calls."""
+    return {'Authorization': f'OAuth {access_token}'}
+
+
+def _dumps_json(payload: Any) -> bytes:
+    """Encode a compact JSON request body, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode()
 
 
 def _should_retry(status_code: int) -> bool:
@@ -29,8 +64,12 @@ def _should_retry(status_code: int) -> bool:
     return status_code in [429, 500, 502, 503, 504]
 
 
-def _get_retry_delay(attempt: int) -> float:
-    """Get delay for retry attempt (exponential backoff)."""
+def _get_retry_delay(attempt: int, response: requests.Response | None = None) -> float:
+    """Get delay for retry attempt: the server's Retry-After if given, else exponential backoff."""
+    if response is not None:
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return min(float(retry_after), MAX_RETRY_AFTER_S)
     if attempt >= len(RETRY_DELAYS):
         return RETRY_DELAYS[-1]
     return RETRY_DELAYS[attempt]
@@ -40,7 +79,9 @@ def upload_track(
     file_path: Path, 
     title: str, 
     access_token: str, 
-    sharing: str = "private"
+    sharing: str = "private",
+    file_size: int | None = None,
+    headers: Dict[str, str] | None = None,
 ) -> int:
     """Upload a single track to SoundCloud.
     
@@ -49,6 +90,8 @@ def upload_track(
         title: Track title
         access_token: Valid SoundCloud access token
         sharing: "private" or "public"
+        file_size: Size in bytes if already known; skips the stat
+        headers: Prebuilt auth headers, shared across a batch
         
     Returns:
         SoundCloud track ID
@@ -57,136 +100,160 @@ def upload_track(
         RuntimeError: If upload fails after all retries
         ValueError: If file is too large or doesn't exist
     """
-    if not file_path.exists():
-        raise ValueError(f"File not found: {file_path}")
+    if file_size is None:
+        try:
+            file_size = file_path.stat().st_size
+        except FileNotFoundError:
+            raise ValueError(f"File not found: {file_path}")
     
-    file_size = file_path.stat().st_size
     if file_size > MAX_FILE_SIZE:
         raise ValueError(f"File too large: {file_size} bytes (max: {MAX_FILE_SIZE})")
     
     logger.info(f"Uploading {file_path.name} ({file_size / 1024 / 1024:.1f}MB)")
     
-    # Prepare multipart form data
-    files = {
-        'track[asset_data]': (file_path.name, open(file_path, 'rb'), 'audio/flac')
-    }
-    
-    data = {
-        'track[title]': title,
-        'track[sharing]': sharing
-    }
-    
-    headers = {
-        'Authorization': f'OAuth {access_token}'
-    }
+    if headers is None:
+        headers = _auth_headers(access_token)
     
     last_error = None
     
-    try:
-        for attempt in range(MAX_RETRIES + 1):
-            try:
-                response = requests.post(
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            # Stream the multipart body from disk instead of buffering it.
+            # The encoder can't be rewound, so re-open the file on every attempt.
+            with open(file_path, 'rb', buffering=UPLOAD_READ_BUFFER) as fh:
+                encoder = MultipartEncoder(fields={
+                    'track[title]': title,
+                    'track[sharing]': sharing,
+                    'track[asset_data]': (file_path.name, fh, 'audio/flac'),
+                })
+                response = _SESSION.post(
                     UPLOAD_URL,
-                    files=files,
-                    data=data,
-                    headers=headers,
-                    timeout=300  # 5 minutes
+                    data=encoder,
+                    headers={**headers, 'Content-Type': encoder.content_type},
+                    timeout=(30, 300)  # connect, read (5 minutes)
                 )
-                
-                if response.status_code == 201:
-                    track_data = response.json()
-                    track_id = track_data['id']
-                    logger.info(f"UPLOAD OK id={track_id} file={file_path.name}")
-                    return track_id
-                
-                elif _should_retry(response.status_code):
-                    if attempt < MAX_RETRIES:
-                        delay = _get_retry_delay(attempt)
-                        logger.warning(f"UPLOAD ERR file={file_path.name} status={response.status_code} retrying in {delay}s")
-                        time.sleep(delay)
-                        continue
-                    else:
-                        logger.error(f"UPLOAD ERR file={file_path.name} status={response.status_code} max retries exceeded")
-                        raise RuntimeError(f"Upload failed after {MAX_RETRIES} retries: {response.status_code}")
-                
-                else:
-                    # Non-retryable error
-                    logger.error(f"UPLOAD ERR file={file_path.name} status={response.status_code}")
-                    raise RuntimeError(f"Upload failed: {response.status_code} - {response.text}")
-                    
-            except requests.RequestException as e:
-                last_error = e
+            
+            if response.status_code == 201:
+                track_data = response.json()
+                track_id = track_data['id']
+                logger.info(f"UPLOAD OK id={track_id} file={file_path.name}")
+                return track_id
+            
+            elif _should_retry(response.status_code):
                 if attempt < MAX_RETRIES:
-                    delay = _get_retry_delay(attempt)
-                    logger.warning(f"UPLOAD ERR file={file_path.name} network error retrying in {delay}s: {e}")
+                    delay = _get_retry_delay(attempt, response)
+                    logger.warning(f"UPLOAD ERR file={file_path.name} status={response.status_code} retrying in {delay}s")
                     time.sleep(delay)
                     continue
                 else:
-                    logger.error(f"UPLOAD ERR file={file_path.name} network error max retries exceeded: {e}")
-                    raise RuntimeError(f"Upload failed after {MAX_RETRIES} retries: {e}")
-    
-    finally:
-        # Close file handle
-        if 'track[asset_data]' in files:
-            files['track[asset_data]'][1].close()
+                    logger.error(f"UPLOAD ERR file={file_path.name} status={response.status_code} max retries exceeded")
+                    raise RuntimeError(f"Upload failed after {MAX_RETRIES} retries: {response.status_code}")
+            
+            else:
+                # Non-retryable error
+                logger.error(f"UPLOAD ERR file={file_path.name} status={response.status_code}")
+                raise RuntimeError(f"Upload failed: {response.status_code} - {response.text}")
+                
+        except requests.RequestException as e:
+            last_error = e
+            if attempt < MAX_RETRIES:
+                delay = _get_retry_delay(attempt)
+                logger.warning(f"UPLOAD ERR file={file_path.name} network error retrying in {delay}s: {e}")
+                time.sleep(delay)
+                continue
+            else:
+                logger.error(f"UPLOAD ERR file={file_path.name} network error max retries exceeded: {e}")
+                raise RuntimeError(f"Upload failed after {MAX_RETRIES} retries: {e}")
     
     # This should never be reached, but just in case
     raise RuntimeError(f"Upload failed: {last_error}")
 
 
+def _try_upload(
+    file_path: Path,
+    title: str,
+    access_token: str,
+    sharing: str,
+    file_size: int,
+    headers: Dict[str, str],
+) -> int | Exception:
+    """Upload a track, returning the track ID or the exception instead of raising."""
+    try:
+        return upload_track(file_path, title, access_token, sharing, file_size=file_size, headers=headers)
+    except Exception as e:
+        return e
+
+
 def upload_many(
     files: List[Path], 
     access_token: str, 
     sharing: str = "private",
-    title_prefix: str | None = None
+    title_prefix: str | None = None,
+    max_workers: int = UPLOAD_WORKERS,
 ) -> Dict[str, List]:
-    """Upload multiple tracks to SoundCloud.
+    """Upload multiple tracks to SoundCloud concurrently.
     
     Args:
         files: List of FLAC file paths to upload
         access_token: Valid SoundCloud access token
         sharing: "private" or "public"
         title_prefix: Optional prefix for track titles
+        max_workers: Number of concurrent uploads
         
     Returns:
-        Dict with 'uploaded' and 'failed' lists
+        Dict with 'uploaded' and 'failed' lists, in input order
     """
-    uploaded = []
-    failed = []
+    uploaded: Dict[int, Tuple[Path, int]] = {}
+    failed: Dict[int, Path] = {}
     
-    logger.info(f"Starting batch upload of {len(files)} files")
+    logger.info(f"Starting batch upload of {len(files)} files ({max_workers} workers)")
     start_time = time.time()
     
-    for i, file_path in enumerate(files, 1):
+    # Stat everything up front so oversize or missing files never reach the pool
+    candidates: List[Tuple[int, Path, int]] = []
+    for i, file_path in enumerate(files):
         try:
-            # Generate title
-            title = file_path.stem
-            if title_prefix:
-                title = f"{title_prefix} - {title}"
-            
-            # Check file size
-            if file_path.stat().st_size > MAX_FILE_SIZE:
-                logger.warning(f"SKIP file={file_path.name} too large")
-                failed.append(file_path)
-                continue
-            
-            track_id = upload_track(file_path, title, access_token, sharing)
-            uploaded.append((file_path, track_id))
-            
-            # Small delay between uploads to be nice to the API
-            if i < len(files):
-                time.sleep(1)
-                
-        except Exception as e:
+            size = file_path.stat().st_size
+        except OSError as e:
             logger.error(f"UPLOAD FAILED file={file_path.name} error={e}")
-            failed.append(file_path)
+            failed[i] = file_path
+            continue
+        if size > MAX_FILE_SIZE:
+            logger.warning(f"SKIP file={file_path.name} too large")
+            failed[i] = file_path
+            continue
+        candidates.append((i, file_path, size))
+    
+    def title_for(file_path: Path) -> str:
+        title = file_path.stem
+        if title_prefix:
+            title = f"{title_prefix} - {title}"
+        return title
+    
+    # Workers share the pooled module session, so uploads reuse TCP/TLS connections.
+    # Results are recorded and reported here, on the main thread only.
+    headers = _auth_headers(access_token)
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futures = {
+            ex.submit(_try_upload, file_path, title_for(file_path), access_token, sharing, size, headers): (i, file_path)
+            for i, file_path, size in candidates
+        }
+        for fut in as_completed(futures):
+            i, file_path = futures[fut]
+            result = fut.result()
+            if isinstance(result, Exception):
+                logger.error(f"UPLOAD FAILED file={file_path.name} error={result}")
+                failed[i] = file_path
+            else:
+                uploaded[i] = (file_path, result)
     
     elapsed = time.time() - start_time
     logger.info(f"BATCH SUMMARY uploaded={len(uploaded)} failed={len(failed)} elapsed={elapsed:.0f}s")
     
+    # Keep input order so playlists match the order of the files
     return {
-        'uploaded': uploaded,
-        'failed': failed
+        'uploaded': [uploaded[i] for i in sorted(uploaded)],
+        'failed': [failed[i] for i in sorted(failed)]
     }
 
 
@@ -225,13 +292,27 @@ def create_playlist(
         form.setdefault('playlist[tracks][][id]', []).append(str(tid))
 
     try:
-        response = requests.post(
+        response = _SESSION.post(
             PLAYLIST_URL,
             data=form,
             headers=form_headers,
             timeout=60
         )
 
+        if response.status_code in (400, 415, 422):
+            # Repeated-key form rejected: retry once with the JSON body format
+            logger.warning(f"PLAYLIST CREATE form rejected status={response.status_code}, retrying as JSON")
+            response = _SESSION.post(
+                PLAYLIST_URL,
+                data=_dumps_json({'playlist': {
+                    'title': title,
+                    'sharing': sharing,
+                    'tracks': [{'id': tid} for tid in track_ids],
+                }}),
+                headers={**form_headers, 'Content-Type': 'application/json'},
+                timeout=60
+            )
+
         if response.status_code != 201:
             logger.error(f"PLAYLIST CREATE ERR status={response.status_code} {response.text}")
             raise RuntimeError(f"Playlist creation failed: {response.status_code} - {response.text}")
@@ -246,33 +327,60 @@ def create_playlist(
         raise RuntimeError(f"Playlist creation failed: {e}")
 
 
+def _check_streamable(track_id: int, headers: Dict[str, str], client: Any) -> bool | None:
+    """Check whether a track reports streamable.
+
+    `client` is a requests session or an httpx.Client; both expose the same
+    get() call.
+
+    Returns True/False from the track's streamable flag, or None if the
+    request failed or returned a non-200 status.
+    """
+    try:
+        r = client.get(f"https://api.soundcloud.com/tracks/{track_id}", headers=headers, timeout=5)
+        if r.status_code == 200:
+            return bool(r.json().get('streamable', False))
+    except _POLL_ERRORS:
+        pass
+    return None
+
+
 def _ensure_tracks_streamable(track_ids: List[int], access_token: str, timeout_s: int = 180) -> None:
     """Poll SoundCloud until all given track IDs report streamable or timeout.
 
     This helps avoid a race where freshly uploaded tracks are not yet attachable to playlists.
+    Each round checks all pending tracks in parallel, backing off between rounds.
+    With httpx and h2 installed, the checks share one multiplexed HTTP/2 connection.
+    Checks are never retried by the transport: a slow answer just waits for
+    the next round, so the deadline holds.
     """
     deadline = time.time() + timeout_s
     headers = {'Authorization': f'OAuth {access_token}'}
     pending = set(track_ids)
-
-    while pending and time.time() < deadline:
-        ready_now = []
-        for track_id in list(pending):
-            try:
-                r = requests.get(f"https://api.soundcloud.com/tracks/{track_id}", headers=headers, timeout=15)
-                if r.status_code == 200:
-                    data = r.json()
-                    # Consider a track ready if streamable flag is present and true
-                    if bool(data.get('streamable', False)):
-                        ready_now.append(track_id)
-                # Non-200 responses: keep waiting unless it's a hard error
-            except requests.RequestException:
-                # transient; continue
-                pass
-        for tid in ready_now:
-            pending.discard(tid)
-        if pending:
-            time.sleep(3)
+    delay = 3
+
+    if httpx is not None:
+        client = httpx.Client(http2=True, timeout=5.0)
+    else:
+        # The shared session retries GETs, nesting its timeouts in each round
+        client = requests.Session()
+        client.mount("https://", HTTPAdapter(pool_maxsize=8, max_retries=0))
+        client.headers.update(_SESSION.headers)
+    try:
+        while pending and time.time() < deadline:
+            with ThreadPoolExecutor(max_workers=min(8, len(pending))) as ex:
+                results = list(ex.map(
+                    lambda tid: (tid, _check_streamable(tid, headers, client)), list(pending)
+                ))
+            for tid, ready in results:
+                if ready:
+                    pending.discard(tid)
+            remaining = deadline - time.time()
+            if pending and remaining > 0:
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, 15)
+    finally:
+        client.close()
 
     if pending:
         logger.warning(f"Some tracks may not be fully processed yet: {sorted(pending)}")
@@ -289,7 +397,7 @@ def _update_playlist_tracks_with_retries(playlist_id: int, track_ids: List[int],
         form: Dict[str, Any] = {}
         for i, tid in enumerate(track_ids):
             form[f'playlist[tracks][{i}][id]'] = tid
-        return requests.put(
+        return _SESSION.put(
             f"{PLAYLIST_URL}/{playlist_id}",
             data=form,
             headers=form_headers,
@@ -298,7 +406,7 @@ def _update_playlist_tracks_with_retries(playlist_id: int, track_ids: List[int],
 
     def read_count() -> int | None:
         try:
-            r = requests.get(f"{PLAYLIST_URL}/{playlist_id}", headers=form_headers, timeout=20)
+            r = _SESSION.get(f"{PLAYLIST_URL}/{playlist_id}", headers=form_headers, timeout=20)
             if r.status_code == 200:
                 data = r.json()
                 return int(data.get('track_count') or 0)
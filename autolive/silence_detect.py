@@ -1,19 +1,33 @@
 """Silence detection module for finding musical "song" regions in long recordings.
 
-Uses pydub's silence utilities with auto-threshold estimation and intelligent merging.
+Decodes a mono float32 stream with ffmpeg and finds silence with NumPy, with
+pydub's silence utilities kept as a fallback; auto-threshold estimation and
+intelligent merging sit on top of either.
 """
 
 from __future__ import annotations
 
+import json
 import logging
+import subprocess
 from pathlib import Path
 from typing import List, Tuple
 
+import numpy as np
 from pydub import AudioSegment
 from pydub.silence import detect_nonsilent
 
+from .convert import FFMPEG
+
+try:
+    from numba import njit
+except ImportError:  # optional JIT for the silence sweep
+    njit = None
+
 logger = logging.getLogger(__name__)
 
+ANALYSIS_SAMPLE_RATE = 8000  # Hz; plenty for level-based silence detection
+
 
 def estimate_silence_threshold(
     audio_path: Path,
@@ -21,6 +35,7 @@ def estimate_silence_threshold(
     analysis_seg_ms: int = 50,
     bottom_percentile: float = 0.25,
     floor_headroom_db: float = 3.5,
+    cache: bool = True,
 ) -> float:
     """Return an estimated silence threshold (dBFS) from the audio.
     
@@ -32,36 +47,66 @@ def estimate_silence_threshold(
         analysis_seg_ms: Segment size for analysis in milliseconds (default: 50)
         bottom_percentile: Percentile of quietest segments to use as noise floor (default: 0.30)
         floor_headroom_db: Extra dB above noise floor for threshold (default: 2.0)
+        cache: Reuse the sidecar decode written by `detect_song_spans`, if any
         
     Returns:
         Estimated silence threshold in dBFS (negative value)
     """
     logger.info(f"Estimating silence threshold for {audio_path.name}")
     
-    # Load audio and take analysis sample
-    audio = AudioSegment.from_file(str(audio_path))
-    sample_duration_ms = min(analysis_sample_sec * 1000, len(audio))
-    sample = audio[:sample_duration_ms]
+    sr = ANALYSIS_SAMPLE_RATE
+    pcm = _read_cached_pcm(audio_path, sr) if cache else None
+    if pcm is None:
+        # No full decode to reuse; ffmpeg stops after the analysis window
+        pcm = _decode_mono_f32(audio_path, sr, analysis_sample_sec)
     
-    logger.info(f"Analyzing {sample_duration_ms/1000:.1f}s sample with {analysis_seg_ms}ms segments")
+    return _estimate_silence_threshold_from_pcm(
+        pcm[:analysis_sample_sec * sr], sr, analysis_seg_ms, bottom_percentile, floor_headroom_db
+    )
+
+
+def _estimate_silence_threshold_from_audio(
+    sample: AudioSegment,
+    analysis_seg_ms: int = 50,
+    bottom_percentile: float = 0.25,
+    floor_headroom_db: float = 3.5,
+) -> float:
+    """Estimate the silence threshold (dBFS) from an already-decoded sample."""
+    logger.info(f"Analyzing {len(sample)/1000:.1f}s sample with {analysis_seg_ms}ms segments")
     
-    # Split into segments and measure dBFS
-    segment_dbs = []
-    for i in range(0, len(sample), analysis_seg_ms):
-        segment = sample[i:i + analysis_seg_ms]
-        if len(segment) > 0:
-            db = segment.dBFS
-            if db != float('-inf'):  # Skip completely silent segments
-                segment_dbs.append(db)
+    # Measure dBFS of every segment in one pass over the raw samples
+    segment_dbs = _segment_dbfs(sample, analysis_seg_ms)
+    return _threshold_from_levels(segment_dbs, bottom_percentile, floor_headroom_db)
+
+
+def _estimate_silence_threshold_from_pcm(
+    pcm: np.ndarray,
+    sample_rate: int,
+    analysis_seg_ms: int = 50,
+    bottom_percentile: float = 0.25,
+    floor_headroom_db: float = 3.5,
+) -> float:
+    """Estimate the silence threshold (dBFS) from mono float PCM in [-1, 1]."""
+    logger.info(f"Analyzing {len(pcm)/sample_rate:.1f}s sample with {analysis_seg_ms}ms segments")
     
-    if not segment_dbs:
+    seg_len = max(1, sample_rate * analysis_seg_ms // 1000)
+    segment_dbs = _frame_dbfs(pcm, seg_len, 1.0)
+    return _threshold_from_levels(segment_dbs, bottom_percentile, floor_headroom_db)
+
+
+def _threshold_from_levels(
+    segment_dbs: np.ndarray,
+    bottom_percentile: float,
+    floor_headroom_db: float,
+) -> float:
+    """Pick the noise floor percentile from segment levels and add headroom."""
+    if segment_dbs.size == 0:
         logger.warning("No valid audio segments found, using conservative threshold")
         return -40.0
     
-    # Sort and find noise floor
-    segment_dbs.sort()
+    # Select the noise floor percentile (O(n), no full sort needed)
     floor_index = int(len(segment_dbs) * bottom_percentile)
-    noise_floor_db = segment_dbs[floor_index]
+    noise_floor_db = float(np.partition(segment_dbs, floor_index)[floor_index])
     
     # Add headroom to get threshold
     threshold_db = noise_floor_db + floor_headroom_db
@@ -72,6 +117,211 @@ def estimate_silence_threshold(
     return threshold_db
 
 
+def _segment_dbfs(sample: AudioSegment, seg_ms: int) -> np.ndarray:
+    """Return dBFS of consecutive `seg_ms` slices, as pydub's `segment.dBFS` would.
+    
+    Fully silent slices (-inf dBFS) are dropped.
+    """
+    dtype = {1: np.int8, 2: np.int16, 4: np.int32}[sample.sample_width]
+    samples = np.frombuffer(sample.raw_data, dtype=dtype)
+    
+    # One row per segment, all channels interleaved, like pydub's rms
+    seg_len = max(1, int(seg_ms * sample.frame_rate / 1000)) * sample.channels
+    max_sq = float(1 << (8 * sample.sample_width - 1)) ** 2
+    return _frame_dbfs(samples, seg_len, max_sq)
+
+
+def _frame_dbfs(samples: np.ndarray, seg_len: int, max_sq: float) -> np.ndarray:
+    """Return dBFS of consecutive `seg_len`-sample frames (plus any partial tail).
+    
+    Fully silent frames (-inf dBFS) are dropped.
+    """
+    samples = samples.astype(np.float64)
+    n = len(samples) // seg_len
+    power = np.square(samples[:n * seg_len].reshape(n, seg_len)).mean(axis=1)
+    tail = samples[n * seg_len:]
+    if tail.size:
+        power = np.append(power, np.square(tail).mean())
+    
+    power = power[power > 0]
+    return 10 * np.log10(power / max_sq)
+
+
+def _decode_mono_f32(
+    audio_path: Path,
+    sample_rate: int = ANALYSIS_SAMPLE_RATE,
+    duration_s: float | None = None,
+) -> np.ndarray:
+    """Decode audio to a mono float32 array in [-1, 1] via an ffmpeg pipe.
+    
+    Only the first `duration_s` seconds are decoded when given.
+    
+    Raises:
+        RuntimeError: If ffmpeg is missing or fails to decode the file
+    """
+    if FFMPEG is None:
+        raise RuntimeError("ffmpeg not found in PATH. Please install ffmpeg.")
+    
+    cmd = [FFMPEG, "-hide_banner", "-nostdin", "-loglevel", "error"]
+    if duration_s is not None:
+        cmd += ["-t", str(duration_s)]
+    cmd += [
+        "-i", str(audio_path),
+        "-ac", "1", "-ar", str(sample_rate),
+        "-f", "f32le", "-",
+    ]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to decode {audio_path.name}: {proc.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(proc.stdout, dtype=np.float32)
+
+
+def _pcm_cache_paths(audio_path: Path) -> Tuple[Path, Path]:
+    """Return the (PCM, stamp) sidecar paths for `audio_path`.
+    
+    The full source name is kept, so `show.wav` and `show.flac` in one
+    directory get separate sidecars.
+    """
+    return (
+        audio_path.with_name(audio_path.name + '.f32.npy'),
+        audio_path.with_name(audio_path.name + '.f32.json'),
+    )
+
+
+def _pcm_stamp(audio_path: Path, sample_rate: int) -> dict:
+    st = audio_path.stat()
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sample_rate': sample_rate}
+
+
+def _read_cached_pcm(audio_path: Path, sample_rate: int = ANALYSIS_SAMPLE_RATE) -> np.ndarray | None:
+    """Return the memory-mapped sidecar decode of `audio_path`, or None if missing or stale."""
+    cache_path, stamp_path = _pcm_cache_paths(audio_path)
+    try:
+        if json.loads(stamp_path.read_text()) == _pcm_stamp(audio_path, sample_rate):
+            pcm = np.load(cache_path, mmap_mode='r')
+            logger.info(f"Using cached decode {cache_path.name}")
+            return pcm
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _load_or_cache_pcm(
+    audio_path: Path,
+    sample_rate: int = ANALYSIS_SAMPLE_RATE,
+    cache: bool = True,
+) -> np.ndarray:
+    """Return the mono float32 decode of `audio_path`, cached in a sidecar file.
+    
+    With `cache` set, the PCM is stored next to the source as
+    `<name>.f32.npy` with a small `<name>.f32.json` stamp of (size, mtime,
+    sample rate). A matching stamp means the sidecar is memory-mapped
+    instead of decoding again. Without it, nothing is read or written.
+    """
+    if cache:
+        pcm = _read_cached_pcm(audio_path, sample_rate)
+        if pcm is not None:
+            return pcm
+    
+    pcm = _decode_mono_f32(audio_path, sample_rate)
+    if cache:
+        cache_path, stamp_path = _pcm_cache_paths(audio_path)
+        try:
+            np.save(cache_path, pcm)
+            # Stamp last, so an interrupted save is never trusted
+            stamp_path.write_text(json.dumps(_pcm_stamp(audio_path, sample_rate)))
+        except OSError as e:
+            logger.warning(f"Could not cache decode for {audio_path.name}: {e}")
+    return pcm
+
+
+def _silent_window_mask_np(
+    pcm: np.ndarray,
+    per_ms: int,
+    total_ms: int,
+    window: int,
+    thresh_power: float,
+) -> np.ndarray:
+    """Flag each millisecond offset whose `window`-ms mean energy is at or below threshold."""
+    frames = pcm[:total_ms * per_ms].reshape(total_ms, per_ms)
+    energy_ms = np.einsum('ij,ij->i', frames, frames, dtype=np.float64) / per_ms
+    
+    # Mean energy of the window starting at each millisecond
+    csum = np.concatenate(([0.0], np.cumsum(energy_ms)))
+    window_energy = (csum[window:] - csum[:-window]) / window
+    return window_energy <= thresh_power
+
+
+def _silent_window_mask_loop(pcm, per_ms, total_ms, window, thresh_power):
+    """Loop form of `_silent_window_mask_np` for Numba: no temporaries, one running sum."""
+    energy = np.empty(total_ms)
+    for k in range(total_ms):
+        acc = 0.0
+        for j in range(k * per_ms, (k + 1) * per_ms):
+            acc += pcm[j] * pcm[j]
+        energy[k] = acc / per_ms
+    
+    n = total_ms - window + 1
+    mask = np.empty(n, dtype=np.bool_)
+    limit = thresh_power * window
+    running = 0.0
+    for k in range(window):
+        running += energy[k]
+    for i in range(n):
+        mask[i] = running <= limit
+        if i + window < total_ms:
+            running += energy[i + window] - energy[i]
+    return mask
+
+
+if njit is not None:
+    _silent_window_mask = njit(cache=True, fastmath=True)(_silent_window_mask_loop)
+else:
+    _silent_window_mask = _silent_window_mask_np
+
+
+def _detect_nonsilent_pcm(
+    pcm: np.ndarray,
+    sample_rate: int,
+    min_silence_len_ms: int,
+    silence_thresh_db: float,
+) -> List[Tuple[int, int]]:
+    """NumPy equivalent of pydub's `detect_nonsilent` (seek_step=1) on mono float PCM.
+    
+    Every millisecond offset is tested for a silent `min_silence_len_ms` window,
+    using a cumulative sum over per-millisecond energy instead of slicing.
+    
+    Returns:
+        List of (start_ms, end_ms) tuples of non-silent regions
+    """
+    per_ms = max(1, sample_rate // 1000)
+    total_ms = len(pcm) // per_ms
+    window = min_silence_len_ms
+    if total_ms == 0:
+        return []
+    if total_ms < window:
+        return [(0, total_ms)]
+    
+    silent = _silent_window_mask(
+        np.asarray(pcm), per_ms, total_ms, window, 10 ** (silence_thresh_db / 10)
+    )
+    silent_starts = np.flatnonzero(silent)
+    
+    if silent_starts.size == 0:
+        return [(0, total_ms)]
+    
+    # Starts within one window of each other belong to the same silent range
+    breaks = np.flatnonzero(np.diff(silent_starts) > window)
+    silence_begin = silent_starts[np.concatenate(([0], breaks + 1))]
+    silence_end = silent_starts[np.concatenate((breaks, [silent_starts.size - 1]))] + window
+    
+    # Non-silent regions are the gaps between silent ranges
+    starts = np.concatenate(([0], silence_end))
+    ends = np.concatenate((silence_begin, [total_ms]))
+    keep = ends > starts
+    return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+
 def detect_song_spans(
     audio_path: Path,
     silence_thresh_db: float | None = None,
@@ -80,10 +330,13 @@ def detect_song_spans(
     target_song_min_ms: int = 120_000,  # 2 min
     target_song_max_ms: int = 600_000,  # 10 min
     merge_adjacent_gap_ms: int = 1000,
+    use_pydub: bool = False,
+    cache: bool = True,
 ) -> List[Tuple[int, int]]:
     """Detect "song" spans as (start_ms, end_ms) from audio file.
     
-    Uses pydub's silence detection with intelligent merging to find song-sized segments.
+    Uses NumPy silence detection on a mono ffmpeg decode (or pydub's, if
+    `use_pydub` is set) with intelligent merging to find song-sized segments.
     
     Args:
         audio_path: Path to audio file
@@ -93,37 +346,51 @@ def detect_song_spans(
         target_song_min_ms: Minimum target song length (default: 180000ms = 3min)
         target_song_max_ms: Maximum target song length (default: 420000ms = 7min)
         merge_adjacent_gap_ms: Merge segments within this gap (default: 10ms)
+        use_pydub: Decode and detect with pydub instead (slower, full-rate audio)
+        cache: Keep the mono decode in a `<name>.f32.npy` sidecar next to the
+            source (about 115MB per hour) and reuse it on later runs
         
     Returns:
         List of (start_ms, end_ms) tuples representing song segments
     """
     logger.info(f"Detecting song spans in {audio_path.name}")
     
+    # Decode once; the threshold estimate reuses the first minute
+    if use_pydub:
+        audio = AudioSegment.from_file(str(audio_path))
+        total_duration_ms = len(audio)
+    else:
+        sr = ANALYSIS_SAMPLE_RATE
+        pcm = _load_or_cache_pcm(audio_path, sr, cache)
+        total_duration_ms = len(pcm) * 1000 // sr
+    logger.info(f"Audio duration: {total_duration_ms/1000:.1f}s")
+    
     # Auto-estimate threshold if not provided
     if silence_thresh_db is None:
-        silence_thresh_db = estimate_silence_threshold(audio_path)
+        if use_pydub:
+            silence_thresh_db = _estimate_silence_threshold_from_audio(audio[:60_000])
+        else:
+            silence_thresh_db = _estimate_silence_threshold_from_pcm(pcm[:60 * sr], sr)
         logger.info(f"Using auto-estimated threshold: {silence_thresh_db:.1f} dBFS")
     else:
         logger.info(f"Using provided threshold: {silence_thresh_db:.1f} dBFS")
     
-    # Load audio
-    audio = AudioSegment.from_file(str(audio_path))
-    total_duration_ms = len(audio)
-    logger.info(f"Audio duration: {total_duration_ms/1000:.1f}s")
-    
     # Detect non-silent regions
-    nonsilent_ranges = detect_nonsilent(
-        audio,
-        min_silence_len=min_silence_len_ms,
-        silence_thresh=silence_thresh_db
-    )
+    if use_pydub:
+        nonsilent_ranges = detect_nonsilent(
+            audio,
+            min_silence_len=min_silence_len_ms,
+            silence_thresh=silence_thresh_db
+        )
+    else:
+        nonsilent_ranges = _detect_nonsilent_pcm(pcm, sr, min_silence_len_ms, silence_thresh_db)
     
     # Apply keep_silence padding to the detected ranges
     if keep_silence_ms > 0:
         padded_ranges = []
         for start, end in nonsilent_ranges:
             new_start = max(0, start - keep_silence_ms)
-            new_end = min(len(audio), end + keep_silence_ms)
+            new_end = min(total_duration_ms, end + keep_silence_ms)
             padded_ranges.append((new_start, new_end))
         nonsilent_ranges = padded_ranges
     
@@ -168,18 +435,15 @@ def _merge_adjacent_ranges(ranges: List[Tuple[int, int]], gap_ms: int) -> List[T
     if not ranges:
         return []
     
-    merged = [ranges[0]]
+    arr = np.asarray(ranges, dtype=np.int64)
+    starts, ends = arr[:, 0], arr[:, 1]
     
-    for current_start, current_end in ranges[1:]:
-        last_start, last_end = merged[-1]
-        
-        # If gap is small enough, merge
-        if current_start - last_end <= gap_ms:
-            merged[-1] = (last_start, current_end)
-        else:
-            merged.append((current_start, current_end))
+    # A range opens a new group when its gap to the previous one is too large
+    keep = np.concatenate(([True], (starts[1:] - ends[:-1]) > gap_ms))
+    group_idx = np.flatnonzero(keep)
+    merged_ends = np.maximum.reduceat(ends, group_idx)
     
-    return merged
+    return list(zip(starts[keep].tolist(), merged_ends.tolist()))
 
 
 def _merge_to_target_lengths(
@@ -187,33 +451,29 @@ def _merge_to_target_lengths(
     min_length_ms: int, 
     max_length_ms: int
 ) -> List[Tuple[int, int]]:
-    """Merge ranges to achieve target song lengths."""
+    """Merge ranges to achieve target song lengths.
+    
+    Starting from each group's first range, following ranges are absorbed
+    while the group is shorter than `min_length_ms` and absorbing would not
+    exceed `max_length_ms`. Ranges must be sorted with non-decreasing ends.
+    """
     if not ranges:
         return []
     
-    result = []
-    current_start, current_end = ranges[0]
+    arr = np.asarray(ranges, dtype=np.int64)
+    starts, ends = arr[:, 0], arr[:, 1]
+    last = len(arr) - 1
     
-    for next_start, next_end in ranges[1:]:
-        current_length = current_end - current_start
-        next_length = next_end - next_start
-        combined_length = next_end - current_start
-        
-        # If current segment is too short, try to merge with next
-        if current_length < min_length_ms:
-            # If combining would exceed max length, start new segment
-            if combined_length > max_length_ms:
-                result.append((current_start, current_end))
-                current_start, current_end = next_start, next_end
-            else:
-                # Merge with next segment
-                current_end = next_end
-        else:
-            # Current segment is long enough, start new one
-            result.append((current_start, current_end))
-            current_start, current_end = next_start, next_end
-    
-    # Add the last segment
-    result.append((current_start, current_end))
+    result = []
+    i = 0
+    while i <= last:
+        group_start = starts[i]
+        # First range whose end makes the group long enough...
+        long_enough = int(np.searchsorted(ends, group_start + min_length_ms, side='left'))
+        # ...and the last range that still fits under the maximum
+        fits = int(np.searchsorted(ends, group_start + max_length_ms, side='right')) - 1
+        j = max(i, min(long_enough, max(fits, i), last))
+        result.append((int(group_start), int(ends[j])))
+        i = j + 1
     
     return result
@@ -1,21 +1,59 @@
 """Track splitting module for exporting individual songs from long recordings.
 
 Takes detected song spans and creates separate FLAC files with proper tagging.
+The recording is decoded once with soundfile and each track is a view into it.
 """
 
 from __future__ import annotations
 
+import hashlib
+import json
 import logging
+import os
+import re
+import shutil
 import subprocess
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing import shared_memory
 from pathlib import Path
 from typing import List, Tuple, Optional, Dict
 
-from pydub import AudioSegment
-from mutagen.flac import FLAC
-from mutagen.id3 import ID3NoHeaderError
+import numpy as np
+
+try:
+    import soundfile as sf
+except ImportError:  # only needed to decode the recording
+    sf = None
 
 logger = logging.getLogger(__name__)
 
+# Sidecar in the output directory recording the inputs of the last full split
+SPANS_HASH_FILE = ".autolive_spans.sha256"
+
+# Bytes of FLAC PADDING reserved at encode time for later tag edits
+FLAC_HEADER_PADDING = 8192
+
+# ffmpeg raw PCM formats by sample width in bytes
+_PCM_FORMATS = {2: "s16le", 4: "s32le"}
+
+# soundfile subtypes that need 32-bit samples to avoid truncation
+_WIDE_SUBTYPES = {"PCM_24", "PCM_32", "FLOAT", "DOUBLE"}
+
+# Fixed encoder arguments, built once; per-format input args sit between them
+_FFMPEG_PREFIX = ("-hide_banner", "-loglevel", "error", "-y")
+_FFMPEG_FLAC_SUFFIX = (
+    "-c:a", "flac",
+    "-threads", "0",
+    # Reserve room so later tag edits can rewrite metadata in place
+    "-metadata_header_padding", str(FLAC_HEADER_PADDING),
+)
+_FLAC_CLI_PREFIX = (
+    "--silent", "--force",
+    "--force-raw-format", "--endian=little", "--sign=signed",
+    f"--padding={FLAC_HEADER_PADDING}",
+)
+
 
 def ms_to_hms(ms: int) -> str:
     """Return mm:ss (or hh:mm:ss) string for milliseconds.
@@ -24,15 +62,12 @@ def ms_to_hms(ms: int) -> str:
         65000 -> "1:05"
         3661000 -> "1:01:01"
     """
-    total_seconds = ms // 1000
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    seconds = total_seconds % 60
+    minutes, seconds = divmod(ms // 1000, 60)
+    hours, minutes = divmod(minutes, 60)
     
-    if hours > 0:
+    if hours:
         return f"{hours}:{minutes:02d}:{seconds:02d}"
-    else:
-        return f"{minutes}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
 
 
 def split_tracks(
@@ -47,6 +82,8 @@ def split_tracks(
     venue: Optional[str] = None,
     show_date_iso: Optional[str] = None,  # "YYYY-MM-DD"
     start_index: int = 1,
+    jobs: Optional[int] = None,
+    flac_compression: int = 5,
 ) -> List[Path]:
     """Split a long recording into separate FLAC files using given spans.
     
@@ -62,6 +99,9 @@ def split_tracks(
         venue: venue name for tags
         show_date_iso: show date in YYYY-MM-DD format
         start_index: first track number (default 1)
+        jobs: parallel encoder processes (default: CPU count)
+        flac_compression: FLAC level 0-8; 0 is fastest (previews), 8 smallest
+            (archival), 5 balances size and speed
         
     Returns:
         List of output file paths (in order)
@@ -72,141 +112,391 @@ def split_tracks(
     # Create output directory
     out_dir.mkdir(parents=True, exist_ok=True)
     
-    # Load the full audio file
+    # Skip the decode and every encode when this exact split already exists
+    expected = [out_dir / f"track_{i:02d}.flac"
+                for i in range(start_index, start_index + len(song_spans))]
+    try:
+        digest = _spans_digest(
+            audio_path, song_spans, keep_head_ms, keep_tail_ms, fade_ms, title_prefix,
+            band, venue, show_date_iso, start_index, flac_compression,
+        )
+    except OSError as e:
+        logger.error(f"Failed to load audio file: {e}")
+        raise
+    hash_path = out_dir / SPANS_HASH_FILE
+    try:
+        stored = hash_path.read_text().strip()
+    except OSError:
+        stored = None
+    if stored == digest and all(path.exists() for path in expected):
+        logger.info(f"Tracks already up to date in {out_dir}, skipping split")
+        return expected
+    # A stale hash must not vouch for the partial output of an interrupted run
+    hash_path.unlink(missing_ok=True)
+    
+    # Decode the full file once, straight into shared memory; every track
+    # below is a frame range that workers map without copying
     logger.info("Loading audio file...")
     try:
-        audio = AudioSegment.from_file(str(audio_path))
-        total_duration_ms = len(audio)
+        shm, samples, sample_rate = _load_pcm_shared(audio_path)
+        total_duration_ms = 1000 * len(samples) // sample_rate
         logger.info(f"Loaded {total_duration_ms/1000:.1f}s of audio")
     except Exception as e:
         logger.error(f"Failed to load audio file: {e}")
         raise
     
-    output_files = []
+    try:
+        output_files = _encode_tracks(
+            shm.name, samples.shape, samples.dtype.str, sample_rate, song_spans,
+            out_dir, keep_head_ms, keep_tail_ms, fade_ms, title_prefix, band,
+            venue, show_date_iso, start_index, jobs, flac_compression,
+        )
+    finally:
+        # Views must be gone before the segment can be closed
+        del samples
+        shm.close()
+        shm.unlink()
+    
+    if len(output_files) == len(song_spans):
+        hash_path.write_text(digest + "\n")
+    logger.info(f"Successfully created {len(output_files)} tracks")
+    return output_files
+
+
+def _spans_digest(audio_path: Path, song_spans: List[Tuple[int, int]], *params) -> str:
+    """Return a sha256 identifying a split of `audio_path` into `song_spans`.
+    
+    The source is identified by path, size and mtime rather than its content,
+    so checking an unchanged split costs a stat instead of reading the file.
+    `params` are the remaining settings that change the encoded output.
+    """
+    st = audio_path.stat()
+    key = [str(audio_path.resolve()), st.st_size, st.st_mtime_ns,
+           [[int(start), int(end)] for start, end in song_spans], list(params)]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+
+def _load_pcm_shared(audio_path: Path) -> Tuple[shared_memory.SharedMemory, np.ndarray, int]:
+    """Decode audio into shared memory as a (frames, channels) integer array.
+    
+    16-bit (and narrower) sources decode to int16; 24-bit, 32-bit and float
+    sources decode to int32 so no resolution is lost. The caller owns the
+    returned segment and must close and unlink it.
     
-    for i, (start_ms, end_ms) in enumerate(song_spans, start_index):
+    Returns:
+        (shared memory segment, samples view into it, sample rate)
+    
+    Raises:
+        RuntimeError: If soundfile is not installed
+    """
+    if sf is None:
+        raise RuntimeError("soundfile not installed. Please install soundfile.")
+    
+    info = sf.info(str(audio_path))
+    dtype = np.dtype(np.int32 if info.subtype in _WIDE_SUBTYPES else np.int16)
+    shape = (info.frames, info.channels)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, shape[0] * shape[1] * dtype.itemsize))
+    try:
+        buffer = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        # Decode in place; the header frame count can overestimate, so keep what was read
+        samples, sample_rate = sf.read(str(audio_path), dtype=dtype.name, always_2d=True, out=buffer)
+        del buffer
+    except Exception:
+        buffer = samples = None
+        shm.unlink()
         try:
+            shm.close()
+        except BufferError:
+            pass
+        raise
+    return shm, samples, sample_rate
+
+
+def _encode_tracks(
+    shm_name: str,
+    shape: Tuple[int, int],
+    dtype: str,
+    sample_rate: int,
+    song_spans: List[Tuple[int, int]],
+    out_dir: Path,
+    keep_head_ms: int,
+    keep_tail_ms: int,
+    fade_ms: int,
+    title_prefix: Optional[str],
+    band: Optional[str],
+    venue: Optional[str],
+    show_date_iso: Optional[str],
+    start_index: int,
+    jobs: Optional[int],
+    flac_compression: int,
+) -> List[Path]:
+    """Fan the tracks out to worker processes and collect them in order."""
+    total_duration_ms = 1000 * shape[0] // sample_rate
+    
+    # Encode tracks in parallel; ffmpeg's FLAC encoder is single-threaded
+    jobs = max(1, jobs or os.cpu_count() or 1)
+    # Spare cores go to the encoder's own threads when it supports them
+    threads = max(1, (os.cpu_count() or 1) // jobs)
+    futures: List[Tuple[int, Future]] = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for i, (start_ms, end_ms) in enumerate(song_spans, start_index):
             # Calculate padded boundaries
             padded_start = max(0, start_ms - keep_head_ms)
             padded_end = min(total_duration_ms, end_ms + keep_tail_ms)
             
-            # Extract the segment
-            segment = audio[padded_start:padded_end]
-            segment_duration_ms = len(segment)
-            
-            logger.info(f"Track {i}: {ms_to_hms(start_ms)} - {ms_to_hms(end_ms)} "
-                       f"({ms_to_hms(segment_duration_ms)})")
+            # Frame range of the segment within the shared recording
+            start_frame = padded_start * sample_rate // 1000
+            end_frame = min(padded_end * sample_rate // 1000, shape[0])
+            segment_duration_ms = 1000 * (end_frame - start_frame) // sample_rate
             
-            # Apply fades if requested
-            if fade_ms > 0 and segment_duration_ms > fade_ms * 2:
-                segment = segment.fade_in(fade_ms).fade_out(fade_ms)
-                logger.debug(f"Applied {fade_ms}ms fade in/out")
+            # Per-track lines format lazily; ms_to_hms only runs if INFO is on
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Track %d: %s - %s (%s)", i, ms_to_hms(start_ms),
+                            ms_to_hms(end_ms), ms_to_hms(segment_duration_ms))
             
             # Generate output filename
-            track_num = f"{i:02d}"
-            output_filename = f"track_{track_num}.flac"
-            output_path = out_dir / output_filename
-            
-            # Export using ffmpeg for high quality FLAC
-            _export_segment_to_flac(segment, output_path)
-            
-            # Add metadata tags
-            _add_flac_tags(
-                output_path,
+            output_path = out_dir / f"track_{i:02d}.flac"
+            tags = _flac_tags(
                 track_num=i,
                 title_prefix=title_prefix,
                 band=band,
                 venue=venue,
                 show_date_iso=show_date_iso,
-                duration_ms=segment_duration_ms
+                duration_ms=segment_duration_ms,
             )
-            
-            output_files.append(output_path)
-            logger.info(f"✅ Created: {output_path.name}")
-            
-        except Exception as e:
-            logger.error(f"❌ Failed to process track {i}: {e}")
-            continue
-    
-    logger.info(f"Successfully created {len(output_files)} tracks")
+            futures.append((i, executor.submit(
+                _encode_track, shm_name, shape, dtype, start_frame, end_frame,
+                sample_rate, fade_ms, output_path, tags, threads, flac_compression,
+            )))
+        
+        # Collect in track order; one failed track doesn't stop the others
+        output_files = []
+        for i, future in futures:
+            try:
+                output_path = future.result()
+                output_files.append(output_path)
+                logger.info("✅ Created: %s", output_path.name)
+            except Exception as e:
+                logger.error("❌ Failed to process track %d: %s", i, e)
     return output_files
 
 
-def _export_segment_to_flac(segment: AudioSegment, output_path: Path) -> None:
-    """Export an AudioSegment to FLAC using ffmpeg for best quality."""
-    # Create temporary WAV file for ffmpeg input
-    temp_wav = output_path.with_suffix('.tmp.wav')
+@lru_cache(maxsize=8)
+def _fade_ramp(fade_frames: int) -> np.ndarray:
+    """Return a read-only linear 0..1 gain ramp shaped (fade_frames, 1).
     
+    Every track in a split shares the same fade length, so each worker
+    builds the ramp once.
+    """
+    ramp = np.linspace(0.0, 1.0, fade_frames)[:, None]
+    ramp.flags.writeable = False
+    return ramp
+
+
+def _apply_fades(segment: np.ndarray, sample_rate: int, fade_ms: int) -> List[np.ndarray]:
+    """Split `segment` into faded-in head, untouched middle and faded-out tail.
+    
+    Only the two edges are copied and scaled by a linear ramp; the middle
+    stays a view into the shared recording, which is left untouched.
+    """
+    fade_frames = fade_ms * sample_rate // 1000
+    ramp = _fade_ramp(fade_frames)
+    head = (segment[:fade_frames] * ramp).astype(segment.dtype)
+    tail = (segment[-fade_frames:] * ramp[::-1]).astype(segment.dtype)
+    return [head, segment[fade_frames:-fade_frames], tail]
+
+
+def _encode_track(
+    shm_name: str,
+    shape: Tuple[int, int],
+    dtype: str,
+    start_frame: int,
+    end_frame: int,
+    sample_rate: int,
+    fade_ms: int,
+    output_path: Path,
+    tags: Dict[str, str],
+    threads: int = 1,
+    flac_compression: int = 5,
+) -> Path:
+    """Fade and encode one track, tags included. Runs in a worker process.
+    
+    The recording is attached from shared memory by name, so only the frame
+    range crosses the process boundary.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
     try:
-        # Export segment to temporary WAV
-        segment.export(str(temp_wav), format="wav")
-        
-        # Convert to FLAC using ffmpeg
-        cmd = [
-            "ffmpeg", "-y",
-            "-i", str(temp_wav),
-            "-c:a", "flac",
-            "-compression_level", "5",  # Good balance of size/speed
-            str(output_path)
-        ]
+        segment = np.ndarray(shape, dtype=dtype, buffer=shm.buf)[start_frame:end_frame]
+        parts = [segment]
         
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        # Apply fades if requested
+        if fade_ms > 0 and 1000 * len(segment) // sample_rate > fade_ms * 2:
+            parts = _apply_fades(segment, sample_rate, fade_ms)
+            logger.debug("Applied %dms fade in/out", fade_ms)
         
+        # Export using ffmpeg for high quality FLAC, tagged in the same pass
+        _export_segment_to_flac(parts, sample_rate, output_path, tags, threads, flac_compression)
     finally:
-        # Clean up temporary file
-        if temp_wav.exists():
-            temp_wav.unlink()
+        segment = parts = None
+        try:
+            shm.close()
+        except BufferError:
+            # A traceback still references the view; the mapping goes with the worker
+            pass
+    
+    return output_path
+
+
+@lru_cache(maxsize=None)
+def _flac_cli_version() -> Optional[Tuple[int, int]]:
+    """Return the (major, minor) version of the `flac` CLI, or None if unavailable."""
+    exe = shutil.which("flac")
+    if exe is None:
+        return None
+    try:
+        out = subprocess.run([exe, "--version"], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    match = re.search(r"(\d+)\.(\d+)", out)
+    return (int(match[1]), int(match[2])) if match else None
+
+
+class FlacEncoder:
+    """Encodes (frames, channels) PCM arrays of one format to FLAC.
+    
+    16-bit input uses the reference `flac` CLI when installed (multi-threaded
+    from 1.5), otherwise ffmpeg's single-threaded encoder. 32-bit input
+    (24-bit and float sources) always goes to ffmpeg, which writes it as
+    24-bit FLAC; the flac CLI would keep all 32 bits, which many decoders
+    cannot play.
+    One instance per format is cached in each worker process (see
+    `_get_encoder`), so the encoder lookup and input arguments are prepared
+    once and every track only appends its tags and output path.
+    """
+    
+    def __init__(
+        self,
+        sample_rate: int,
+        channels: int,
+        sample_width: int,
+        threads: int = 1,
+        compression: int = 5,
+    ):
+        version = _flac_cli_version()
+        self.use_flac_cli = version is not None and sample_width == 2
+        if self.use_flac_cli:
+            self.cmd_prefix = [
+                shutil.which("flac"), *_FLAC_CLI_PREFIX,
+                f"--compression-level-{compression}",
+                f"--channels={channels}",
+                "--bps=16",
+                f"--sample-rate={sample_rate}",
+            ]
+            if version >= (1, 5) and threads > 1:
+                self.cmd_prefix.append(f"--threads={threads}")
+        else:
+            self.cmd_prefix = [
+                shutil.which("ffmpeg") or "ffmpeg", *_FFMPEG_PREFIX,
+                "-f", _PCM_FORMATS[sample_width],
+                "-ar", str(sample_rate),
+                "-ac", str(channels),
+                "-i", "pipe:0",
+                *_FFMPEG_FLAC_SUFFIX,
+                "-compression_level", str(compression),
+            ]
+    
+    def encode(self, parts: List[np.ndarray], output_path: Path, tags: Dict[str, str]) -> None:
+        """Encode consecutive PCM `parts` to `output_path` through the encoder's stdin.
+        
+        Parts are written one after another, so a track never has to be
+        joined into one buffer. `tags` are written as Vorbis comments during
+        the encode.
+        """
+        cmd = list(self.cmd_prefix)
+        if self.use_flac_cli:
+            cmd += [f"--tag={key}={value}" for key, value in tags.items()]
+            cmd += ["-o", str(output_path), "-"]
+        else:
+            for key, value in tags.items():
+                cmd += ["-metadata", f"{key}={value}"]
+            cmd.append(str(output_path))
+        
+        with subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE) as proc:
+            try:
+                for part in parts:
+                    with memoryview(np.ascontiguousarray(part)).cast("B") as pcm:
+                        proc.stdin.write(pcm)
+            except BrokenPipeError:
+                pass  # the encoder exited early; its stderr says why
+            _, stderr = proc.communicate()
+        
+        if proc.returncode != 0:
+            # stderr only carries errors (-loglevel error / --silent), so decode it just here
+            name = Path(cmd[0]).name
+            raise RuntimeError(f"{name} failed: {stderr.decode(errors='replace').strip()}")
 
 
-def _add_flac_tags(
-    flac_path: Path,
+@lru_cache(maxsize=None)
+def _get_encoder(
+    sample_rate: int,
+    channels: int,
+    sample_width: int,
+    threads: int = 1,
+    compression: int = 5,
+) -> FlacEncoder:
+    """Return this process's encoder for the given PCM format and settings."""
+    return FlacEncoder(sample_rate, channels, sample_width, threads, compression)
+
+
+def _export_segment_to_flac(
+    parts: List[np.ndarray],
+    sample_rate: int,
+    output_path: Path,
+    tags: Dict[str, str],
+    threads: int = 1,
+    flac_compression: int = 5,
+) -> None:
+    """Export consecutive (frames, channels) PCM arrays as one tagged FLAC."""
+    encoder = _get_encoder(
+        sample_rate, parts[0].shape[1], parts[0].dtype.itemsize, threads, flac_compression
+    )
+    encoder.encode(parts, output_path, tags)
+
+
+def _flac_tags(
     track_num: int,
     title_prefix: Optional[str] = None,
     band: Optional[str] = None,
     venue: Optional[str] = None,
     show_date_iso: Optional[str] = None,
     duration_ms: int = 0,
-) -> None:
-    """Add metadata tags to a FLAC file using mutagen."""
-    try:
-        flac_file = FLAC(str(flac_path))
-        
-        # Track number and title
-        flac_file["TRACKNUMBER"] = str(track_num)
-        
-        title = f"Track {track_num:02d}"
-        if title_prefix:
-            title = f"{title_prefix} - {title}"
-        flac_file["TITLE"] = title
-        
-        # Artist/Band
-        if band:
-            flac_file["ARTIST"] = band
-            flac_file["ALBUMARTIST"] = band
-        
-        # Album (venue + date)
-        album_parts = []
-        if venue:
-            album_parts.append(venue)
-        if show_date_iso:
-            album_parts.append(show_date_iso)
-        if album_parts:
-            flac_file["ALBUM"] = " - ".join(album_parts)
-        
-        # Date
-        if show_date_iso:
-            flac_file["DATE"] = show_date_iso
-        
-        # Duration (in seconds)
-        if duration_ms > 0:
-            flac_file["LENGTH"] = str(duration_ms // 1000)
-        
-        # Genre
-        flac_file["GENRE"] = "Live Recording"
-        
-        # Save tags
-        flac_file.save()
-        logger.debug(f"Added tags to {flac_path.name}")
-        
-    except Exception as e:
-        logger.warning(f"Failed to add tags to {flac_path.name}: {e}")
+) -> Dict[str, str]:
+    """Build the Vorbis comment tags for one track."""
+    title = f"Track {track_num:02d}"
+    if title_prefix:
+        title = f"{title_prefix} - {title}"
+    tags = {
+        "TRACKNUMBER": str(track_num),
+        "TITLE": title,
+        "GENRE": "Live Recording",
+    }
+    
+    # Artist/Band
+    if band:
+        tags["ARTIST"] = band
+        tags["ALBUMARTIST"] = band
+    
+    # Album (venue + date)
+    album_parts = [part for part in (venue, show_date_iso) if part]
+    if album_parts:
+        tags["ALBUM"] = " - ".join(album_parts)
+    
+    # Date
+    if show_date_iso:
+        tags["DATE"] = show_date_iso
+    
+    # Duration (in seconds)
+    if duration_ms > 0:
+        tags["LENGTH"] = str(duration_ms // 1000)
+    
+    return tags
@@ -2,7 +2,7 @@ import subprocess
 from pathlib import Path
 from unittest import mock
 
-from autolive.convert import convert_to_flac
+from autolive.convert import _convert_batch, convert_to_flac, main
 
 
 def test_convert_invokes_ffmpeg(tmp_path: Path):
@@ -10,7 +10,7 @@ def test_convert_invokes_ffmpeg(tmp_path: Path):
     dst = tmp_path / "out.flac"
     src.write_bytes(b"RIFF....WAVEdata")
 
-    with mock.patch("shutil.which", return_value="/usr/local/bin/ffmpeg"):
+    with mock.patch("autolive.convert.FFMPEG", "/usr/local/bin/ffmpeg"):
         with mock.patch("subprocess.run") as mrun:
             mrun.return_value = subprocess.CompletedProcess(
                 args=["ffmpeg"], returncode=0, stdout=b"", stderr=b""
@@ -22,3 +22,89 @@ def test_convert_invokes_ffmpeg(tmp_path: Path):
             assert "-c:a" in called_args and "flac" in called_args
 
 
+
+
+def test_convert_batch_uses_single_ffmpeg(tmp_path: Path):
+    pairs = []
+    for name in ("a", "b"):
+        src = tmp_path / f"{name}.wav"
+        src.write_bytes(b"RIFF....WAVEdata")
+        pairs.append((src, tmp_path / "out" / f"{name}.flac"))
+
+    stderr = b"  Duration: 00:03:12.40, start: 0.0\n  Duration: 00:00:12.30, start: 0.0\n"
+    with mock.patch("autolive.convert.FFMPEG", "/usr/local/bin/ffmpeg"):
+        with mock.patch("subprocess.run") as mrun:
+            mrun.return_value = subprocess.CompletedProcess(
+                args=["ffmpeg"], returncode=0, stdout=b"", stderr=stderr
+            )
+            results = _convert_batch(pairs, overwrite=True)
+
+    assert mrun.call_count == 1
+    called_args = mrun.call_args[0][0]
+    assert called_args.count("-i") == 2
+    assert "0:a:0" in called_args and "1:a:0" in called_args
+    # Each output keeps its own input's tags and chapters
+    second = called_args.index("1:a:0")
+    assert called_args[second + 1:second + 5] == ["-map_metadata", "1", "-map_chapters", "1"]
+    assert [ok for ok, _ in results] == [True, True]
+    assert "3m12s" in results[0][1] and "12.3s" in results[1][1]
+
+
+def test_main_spreads_a_small_tree_across_all_jobs(tmp_path: Path):
+    for i in range(32):
+        (tmp_path / f"{i:02d}.wav").write_bytes(b"")
+
+    batches = []
+
+    def convert_batch(files, overwrite):
+        batches.append(len(files))
+        return [(True, "")] * len(files)
+
+    with mock.patch("autolive.convert.FFMPEG", "/usr/local/bin/ffmpeg"), \
+            mock.patch("autolive.convert._convert_batch", side_effect=convert_batch):
+        rc = main(["--in", str(tmp_path), "--out", str(tmp_path / "out"), "--jobs", "8"])
+
+    assert rc == 0
+    assert sorted(batches) == [4] * 8
+
+
+def test_convert_batch_fallback_discards_partial_outputs(tmp_path: Path):
+    pairs = [(tmp_path / f"{name}.wav", tmp_path / f"{name}.flac") for name in ("a", "b", "c")]
+    # c.flac appeared after main()'s scan; ffmpeg -n refuses it
+    pairs[2][1].write_bytes(b"user")
+
+    def run(cmd, **kwargs):
+        if cmd.count("-i") > 1:
+            # The batch run dies after opening the outputs before c.flac
+            for _, dst in pairs[:2]:
+                dst.write_bytes(b"partial")
+            stderr = f"File '{pairs[2][1]}' already exists. Exiting.\n".encode()
+            raise subprocess.CalledProcessError(1, cmd, stderr=stderr)
+        Path(cmd[-1]).write_bytes(b"fLaC")
+        return subprocess.CompletedProcess(cmd, 0, stdout=b"", stderr=b"")
+
+    with mock.patch("autolive.convert.FFMPEG", "/usr/local/bin/ffmpeg"), \
+            mock.patch("subprocess.run", side_effect=run):
+        results = _convert_batch(pairs, overwrite=False)
+
+    assert [msg.split()[0] for _, msg in results] == ["[OK]", "[OK]", "[SKIP]"]
+    assert [dst.read_bytes() for _, dst in pairs] == [b"fLaC", b"fLaC", b"user"]
+
+
+def test_main_rejects_inputs_that_share_an_output_name(tmp_path: Path):
+    for day in ("Day1", "Day2"):
+        (tmp_path / day).mkdir()
+        (tmp_path / day / "ZOOM0001.WAV").write_bytes(b"")
+
+    scheduled = []
+
+    def convert_batch(files, overwrite):
+        scheduled.extend(src for src, _ in files)
+        return [(True, "")] * len(files)
+
+    with mock.patch("autolive.convert.FFMPEG", "/usr/local/bin/ffmpeg"), \
+            mock.patch("autolive.convert._convert_batch", side_effect=convert_batch):
+        rc = main(["--in", str(tmp_path), "--out", str(tmp_path / "out"), "--jobs", "2"])
+
+    assert rc == 1
+    assert len(scheduled) == 1
@@ -0,0 +1,30 @@
+from pathlib import Path
+from unittest import mock
+
+from autolive import sc_uploader
+from autolive.sc_uploader import upload_track
+
+
+def test_upload_retry_resends_full_file(tmp_path: Path):
+    src = tmp_path / "song.flac"
+    src.write_bytes(b"fLaC" + b"\x00" * 4096)
+    bodies = []
+
+    def fake_post(url, data=None, headers=None, timeout=None):
+        # Drain the streamed multipart body like the adapter would
+        bodies.append(data.read())
+        status = 503 if len(bodies) == 1 else 201
+        return mock.Mock(status_code=status, headers={}, json=lambda: {"id": 42}, text="")
+
+    with mock.patch.object(sc_uploader._SESSION, "post", side_effect=fake_post):
+        with mock.patch("autolive.sc_uploader.time.sleep"):
+            assert upload_track(src, "Song", "token") == 42
+
+    assert len(bodies) == 2
+    assert all(src.read_bytes() in body for body in bodies)
+
+
+def test_check_streamable_treats_malformed_json_as_unknown():
+    client = mock.Mock()
+    client.get.return_value = mock.Mock(status_code=200, json=mock.Mock(side_effect=ValueError("bad json")))
+    assert sc_uploader._check_streamable(1, {}, client) is None
@@ -0,0 +1,61 @@
+import numpy as np
+from pydub import AudioSegment
+from pydub.silence import detect_nonsilent
+
+from autolive.silence_detect import (
+    _detect_nonsilent_pcm,
+    _merge_adjacent_ranges,
+    _merge_to_target_lengths,
+    _silent_window_mask_loop,
+    _silent_window_mask_np,
+)
+
+
+def test_merge_adjacent_ranges_joins_small_gaps():
+    ranges = [(0, 100), (150, 300), (1500, 1600), (2000, 2100)]
+    assert _merge_adjacent_ranges(ranges, 500) == [(0, 300), (1500, 2100)]
+    assert _merge_adjacent_ranges(ranges, 10) == ranges
+    assert _merge_adjacent_ranges([], 500) == []
+
+
+def test_merge_to_target_lengths_groups_short_ranges():
+    ranges = [(0, 40), (50, 90), (100, 300), (310, 320), (330, 700), (710, 720)]
+    # Short ranges absorb neighbours until long enough, never past the max
+    assert _merge_to_target_lengths(ranges, 100, 250) == [
+        (0, 90), (100, 300), (310, 320), (330, 700), (710, 720)
+    ]
+    assert _merge_to_target_lengths(ranges, 100, 1000) == [
+        (0, 300), (310, 700), (710, 720)
+    ]
+    # Overlapping ranges (negative merge gap): each is already long enough alone
+    assert _merge_to_target_lengths([(0, 300), (10, 310)], 100, 1000) == [(0, 300), (10, 310)]
+
+
+def test_detect_nonsilent_pcm_matches_pydub():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        # Alternating quiet and loud stretches at 8kHz, built straight from int16 data
+        parts = [
+            rng.standard_normal(8 * int(rng.integers(50, 800))) * rng.choice([5.0, 100.0, 1000.0, 3000.0])
+            for _ in range(rng.integers(2, 6))
+        ]
+        samples = np.clip(np.concatenate(parts), -32768, 32767).astype(np.int16)
+        audio = AudioSegment(samples.tobytes(), frame_rate=8000, sample_width=2, channels=1)
+
+        expected = detect_nonsilent(audio, min_silence_len=200, silence_thresh=-40)
+        got = _detect_nonsilent_pcm(samples.astype(np.float32) / 32768, 8000, 200, -40)
+
+        # pydub truncates RMS to an integer, which can move an edge by 1ms
+        assert len(got) == len(expected)
+        assert np.abs(np.array(got) - np.array(expected)).max(initial=0) <= 1
+
+
+def test_silent_window_mask_loop_matches_numpy():
+    rng = np.random.default_rng(1)
+    # Quiet/loud blocks so the mask has both values and edges between them
+    pcm = (rng.standard_normal(8 * 600) * np.repeat(rng.choice([0.001, 0.5], 12), 400)).astype(np.float32)
+    for window in (1, 50, 200, 600):
+        expected = _silent_window_mask_np(pcm, 8, 600, window, 1e-4)
+        got = _silent_window_mask_loop(pcm, 8, 600, window, 1e-4)
+        assert got.dtype == np.bool_
+        assert np.array_equal(got, expected)
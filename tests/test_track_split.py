@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from autolive import track_split
+from autolive.track_split import _export_segment_to_flac, _flac_tags, _get_encoder
+
+
+def test_export_pipes_pcm_and_tags_in_one_ffmpeg_call(tmp_path: Path):
+    segment = np.arange(200, dtype=np.int16).reshape(100, 2)
+    tags = _flac_tags(3, title_prefix="Show", band="Band")
+
+    piped = []
+    _get_encoder.cache_clear()
+    # Force the ffmpeg path even where the flac CLI is installed
+    with mock.patch("autolive.track_split._flac_cli_version", return_value=None), \
+            mock.patch("subprocess.Popen") as mpopen:
+        proc = mpopen.return_value.__enter__.return_value
+        proc.returncode = 0
+        proc.communicate.return_value = (None, b"")
+        # The memoryviews are released after each write, so copy them as they arrive
+        proc.stdin.write.side_effect = lambda pcm: piped.append(bytes(pcm))
+        _export_segment_to_flac([segment[:10], segment[10:]], 44100, tmp_path / "t.flac", tags)
+
+    assert mpopen.call_count == 1
+    cmd = mpopen.call_args[0][0]
+    assert cmd[cmd.index("-f") + 1] == "s16le"
+    assert "TITLE=Show - Track 03" in cmd and "ARTIST=Band" in cmd
+    assert b"".join(piped) == segment.tobytes()
+
+
+def test_split_tracks_encodes_each_span_end_to_end(tmp_path: Path, monkeypatch):
+    sr = 1000
+    recording = np.arange(20000, dtype=np.int16).reshape(10000, 2)
+
+    def read(path, dtype, always_2d, out):
+        out[:] = recording
+        return out, sr
+
+    fake_sf = SimpleNamespace(
+        info=lambda path: SimpleNamespace(subtype="PCM_16", frames=10000, channels=2, samplerate=sr),
+        read=read,
+    )
+    encoded = {}
+
+    def export(parts, sample_rate, output_path, tags, *args):
+        encoded[output_path.name] = (np.concatenate(parts), tags)
+        output_path.write_bytes(b"fLaC")
+
+    monkeypatch.setattr(track_split, "sf", fake_sf)
+    monkeypatch.setattr(track_split, "_export_segment_to_flac", export)
+    # Same worker code path, run in-process so the patches apply
+    monkeypatch.setattr(track_split, "ProcessPoolExecutor", ThreadPoolExecutor)
+    source = tmp_path / "show.wav"
+    source.write_bytes(b"")
+
+    def split():
+        return track_split.split_tracks(
+            source, [(2000, 4000), (6000, 8000)], tmp_path / "out",
+            keep_head_ms=500, keep_tail_ms=500, fade_ms=100, band="Band",
+        )
+
+    outputs = split()
+
+    assert [p.name for p in outputs] == ["track_01.flac", "track_02.flac"]
+    track, tags = encoded["track_02.flac"]
+    expected = recording[5500:8500]
+    assert track.shape == expected.shape
+    assert np.array_equal(track[100:-100], expected[100:-100])
+    assert not track[0].any() and not track[-1].any()
+    assert tags["ARTIST"] == "Band"
+
+    # An identical re-run finds every track in place and encodes nothing
+    encoded.clear()
+    assert split() == outputs
+    assert not encoded
+
+
+def test_wide_pcm_goes_to_ffmpeg_even_with_flac_cli():
+    _get_encoder.cache_clear()
+    with mock.patch("autolive.track_split._flac_cli_version", return_value=(1, 5)), \
+            mock.patch("shutil.which", side_effect=lambda name: f"/usr/bin/{name}"):
+        assert _get_encoder(44100, 2, 2).use_flac_cli
+        # flac would keep all 32 bits; ffmpeg writes 24-bit FLAC like the source
+        assert not _get_encoder(44100, 2, 4).use_flac_cli
+    _get_encoder.cache_clear()